@@ -2741,6 +2741,9 @@ Continuer ?"""
                     cmd = [sys.executable, "-u", "core/augmentation.py",
                           "--num_aug", str(num_aug),
                           "--target", target]
+                    if aug_type == "Both":
+                        # Effet holographique dans le même passage (images et labels)
+                        cmd += ["--holo", "0.5"]
                     
                     self.current_process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
                                               stderr=subprocess.STDOUT, text=True,
@@ -2754,22 +2757,20 @@ Continuer ?"""
                         self.current_process.wait()
                         if self.current_process.returncode != 0:
                             self.log("❌ Standard augmentation failed!")
-                            if aug_type == "Standard":
-                                messagebox.showerror("Error", "Augmentation failed!")
-                                return
+                            messagebox.showerror("Error", "Augmentation failed!")
+                            return
                         else:
                             self.log("✅ Standard augmentation completed!")
                 
                 # Holographic augmentation
-                if aug_type in ["Holographic", "Both"]:
+                if aug_type == "Holographic":
                     self.log("✨ Running holographic augmentation...")
-                    output_dir = target + "_holographic" if aug_type == "Both" else target
+                    output_dir = target
                     
                     cmd = [sys.executable, "-u", "core/holographic_augmenter.py",
-                           "--input", "images",
-                           "--output", output_dir,
-                           "--intensity", "0.7",
-                           "--variations", str(num_aug)]
+                           "images", output_dir,
+                           "--variations", str(num_aug),
+                           "--workers", "0"]
                     
                     self.current_process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
                                               stderr=subprocess.STDOUT, text=True,
@@ -3106,7 +3107,8 @@ Continuer ?"""
                     output_dir = "images_holographic"
                     # -u pour unbuffered output (logs en temps réel)
                     cmd = [sys.executable, "-u", "core/holographic_augmenter.py",
-                          "images", output_dir, "--variations", str(variations_var.get())]
+                          "images", output_dir, "--variations", str(variations_var.get()),
+                          "--workers", "0"]
                     
                     self.current_process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
                                               stderr=subprocess.STDOUT, text=True, 
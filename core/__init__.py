@@ -12,6 +12,11 @@ Modules disponibles:
 - mosaic: Création de mosaïques YOLO
 - holographic_augmenter: Effets holographiques sur cartes
 - random_erasing: Augmentation par effacement aléatoire
+- card_cache: Cache disque (mmap) des cartes décodées et redimensionnées
+- geometry: Géométrie vectorisée des layouts (coins, projections, labels YOLO)
+- backgrounds: Corpus local et index des fonds de mosaïques
+- shards: Datasets YOLO en shards tar (écriture, lecture, conversion)
+- class_registry: Registre des classes YOLO (cache de cards_info.xlsx, ID = numéro de carte)
 
 **Validation & Export:**
 - dataset_validator: Validation des annotations YOLO
@@ -60,6 +65,11 @@ from . import auto_balancer
 from . import holographic_augmenter
 from . import tcgdex_api
 from . import random_erasing
+from . import card_cache
+from . import geometry
+from . import backgrounds
+from . import shards
+from . import class_registry
 from . import utils
 # from . import numpy_patch  # Patch désactivé : NumPy 1.26.4 dans venv, pas besoin
 from . import workflow_manager
@@ -78,6 +88,11 @@ __all__ = [
     'holographic_augmenter',
     'tcgdex_api',
     'random_erasing',
+    'card_cache',
+    'geometry',
+    'backgrounds',
+    'shards',
+    'class_registry',
     'utils',
     # 'numpy_patch',  # Disponible mais non appliqué automatiquement
     'workflow_manager',
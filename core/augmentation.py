@@ -2,12 +2,14 @@
 import os
 import sys
 import cv2
-import pandas as pd
 from glob import glob
 import re
-import random
-import time
 import argparse
+import hashlib
+import json
+import zlib
+import multiprocessing
+import random
 import numpy as np
 import warnings
 warnings.filterwarnings('ignore', category=FutureWarning)
@@ -28,46 +30,92 @@ if not hasattr(np, 'str'):
     np.str = np.str_
 
 import imgaug.augmenters as iaa
+import imgaug.random as iarandom
+
+# Chargement des cartes via le cache partagé (import relatif ET absolu)
+try:
+    from .card_cache import card_stack, load_stack_row
+    from .class_registry import load_class_registry
+    from .holographic_augmenter import HolographicAugmenter, INTENSITY_LEVELS, OVERLAY_BANK_SIZE, REGIONS
+except ImportError:
+    from card_cache import card_stack, load_stack_row
+    from class_registry import load_class_registry
+    from holographic_augmenter import HolographicAugmenter, INTENSITY_LEVELS, OVERLAY_BANK_SIZE, REGIONS
+from imgaug.augmenters import color as iaa_color
+
+# Correctif imgaug 0.4.0 : ChangeColorTemperature échoue sur les lots de plus
+# d'une image (facteurs d'interpolation (N,) non diffusés sur les multiplicateurs (N, 3))
+def _transform_kelvins_to_rgb_multipliers(self, kelvins):
+    kelvins = np.clip(kelvins, 1000, 40000)
+    tbl_indices = kelvins / 100 - (1000 // 100)
+    tbl_indices_floored = np.floor(tbl_indices)
+    tbl_indices_ceiled = np.ceil(tbl_indices)
+    interpolation_factors = (tbl_indices - tbl_indices_floored)[:, np.newaxis]
+    multipliers_floored = self.table[tbl_indices_floored.astype(np.int32), :]
+    multipliers_ceiled = self.table[tbl_indices_ceiled.astype(np.int32), :]
+    return multipliers_floored + interpolation_factors * (multipliers_ceiled - multipliers_floored)
+
+iaa_color._KelvinToRGBTable.transform_kelvins_to_rgb_multipliers = _transform_kelvins_to_rgb_multipliers
 
 # Taille cible pour redimensionner les images (comme dans le script mosaic)
 TARGET_SIZE = (280, 380)
 # Répertoire contenant les cartes de base (non-augmentées)
 BASE_IMAGES_DIR = "images"
 
-# Parseur d'arguments
-parser = argparse.ArgumentParser(description="Data augmentation for Pokemon cards")
-parser.add_argument("--num_aug", type=int, default=30, help="Nombre d'augmentations par image de base")
-parser.add_argument("--target", type=str, default="augmented", choices=["augmented", "images_aug"],
-                    help="Destination des images augmentées")
-args = parser.parse_args()
-
-# Configuration des dossiers de sortie selon le paramètre --target
-if args.target == "augmented":
-    AUG_OUTPUT_DIR = os.path.join("output", "augmented")
-    AUG_IMAGES_DIR = os.path.join(AUG_OUTPUT_DIR, "images")
-    AUG_LABELS_DIR = os.path.join(AUG_OUTPUT_DIR, "labels")
-else:
-    AUG_OUTPUT_DIR = "images_aug"
-    AUG_IMAGES_DIR = "images_aug"
-    AUG_LABELS_DIR = os.path.join("images_aug_labels")
-
-# Création des dossiers s'ils n'existent pas
-os.makedirs(AUG_IMAGES_DIR, exist_ok=True)
-os.makedirs(AUG_LABELS_DIR, exist_ok=True)
+# Valeurs par défaut de --num_aug et --batch_size (reprises par tools/test_augmentation_variety.py)
+DEFAULT_NUM_AUG = 30
+DEFAULT_BATCH_SIZE = 32
+
+# Formats de sortie : extension et paramètres cv2.imwrite
+IMAGE_FORMATS = {"png": ".png", "jpg": ".jpg", "webp": ".webp"}
+
+def encode_params(image_format, quality=95, png_compression=None):
+    """Paramètres cv2.imwrite pour le format demandé"""
+    if image_format == "jpg":
+        return [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    if image_format == "webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    if png_compression is not None:
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    return []
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Data augmentation for Pokemon cards")
+    parser.add_argument("--num_aug", type=int, default=DEFAULT_NUM_AUG, help="Nombre d'augmentations par image de base")
+    parser.add_argument("--target", type=str, default="augmented", choices=["augmented", "images_aug"],
+                        help="Destination des images augmentées")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Nombre de processus parallèles (1 = séquentiel, 0 = tous les coeurs)")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Nombre de variations d'une carte augmentées en un seul appel imgaug")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Graine racine (reproductibilité bit à bit ; par défaut celle du manifeste, sinon aléatoire)")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignorer le manifeste et régénérer toutes les variations")
+    parser.add_argument("--format", type=str, default="png", choices=sorted(IMAGE_FORMATS),
+                        help="Format des images augmentées")
+    parser.add_argument("--quality", type=int, default=95,
+                        help="Qualité JPEG/WebP (1-100)")
+    parser.add_argument("--png_compression", type=int, default=None, choices=range(10), metavar="0-9",
+                        help="Niveau de compression PNG (défaut OpenCV si absent, 0 = le plus rapide)")
+    parser.add_argument("--holo", type=float, default=0.0,
+                        help="Probabilité d'effet holographique par variation, appliqué dans le même passage "
+                             "(0 = désactivé)")
+    parser.add_argument("--holo_region", choices=sorted(REGIONS), default="full",
+                        help="Zone de l'effet holographique : toute la carte ou seulement l'illustration")
+    return parser.parse_args(argv)
+
+def get_output_dirs(target):
+    """Dossiers de sortie (racine, images, labels) selon le paramètre --target"""
+    if target == "augmented":
+        aug_output_dir = os.path.join("output", "augmented")
+        return aug_output_dir, os.path.join(aug_output_dir, "images"), os.path.join(aug_output_dir, "labels")
+    return "images_aug", "images_aug", os.path.join("images_aug_labels")
 
 def load_card_data(excel_path):
-    df = pd.read_excel(excel_path, usecols=["Set #", "Name"])
-    card_dict = {}
-    class_map = {}
-    class_id = 1  # On commence à 1 (on convertira en 0-index pour YOLO)
-    for _, row in df.iterrows():
-        number = row["Set #"].split('/')[0].zfill(3)
-        name = row["Name"].replace(" ", "_")
-        if number not in card_dict:
-            card_dict[number] = name
-            class_map[number] = class_id
-            class_id += 1
-    return card_dict, class_map
+    # Registre partagé avec mosaic.py (cache JSON) : l'ID YOLO = le numéro de la carte
+    registry = load_class_registry(excel_path)
+    return registry.card_dict, registry.class_map
 
 def extract_card_number(filename):
     """
@@ -94,22 +142,6 @@ def extract_card_number(filename):
     
     return None
 
-def resize_cards(image_paths, target_size=TARGET_SIZE):
-    resized_images = []
-    for img_path in image_paths:
-        img = cv2.imread(img_path, cv2.IMREAD_UNCHANGED)
-        if img is None:
-            continue
-        
-        # Convertir RGBA en RGB si nécessaire
-        if len(img.shape) == 3 and img.shape[2] == 4:
-            # Image a un canal alpha, le convertir en RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-        
-        img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
-        resized_images.append((img, img_path))
-    return resized_images
-
 # Pipeline d'augmentation avec imgaug - VERSION AMÉLIORÉE (plus de variété)
 # Applique 2 à 5 transformations aléatoires parmi une liste étendue
 seq = iaa.SomeOf((2, 5), [
@@ -147,58 +179,345 @@ seq = iaa.SomeOf((2, 5), [
     iaa.ElasticTransformation(alpha=(0, 5), sigma=0.5),
 ], random_order=True)
 
-def main():
-    card_dict, class_map = load_card_data("cards_info.xlsx")
+
+class Holographic(iaa.meta.Augmenter):
+    """
+    Effet holographique de HolographicAugmenter sous forme d'augmenteur imgaug,
+    à insérer dans le pipeline avec une probabilité : iaa.Sometimes(p, Holographic()).
+    La géométrie de la carte ne change pas : les labels restent valides.
+    """
+
+    def __init__(self, intensity=tuple(INTENSITY_LEVELS), bank_size=OVERLAY_BANK_SIZE, region='full',
+                 seed=None, name=None):
+        """
+        Args:
+            intensity: Intensités tirées au hasard ('light', 'medium', 'heavy')
+            bank_size: Calques pré-calculés par (taille, intensité), 0 = calques générés par image
+            region: Zone des effets ('full', 'artwork', fractions ou masque, voir HolographicAugmenter)
+        """
+        super().__init__(seed=seed, name=name)
+        self.intensity = list(intensity)
+        self.bank_size = bank_size
+        self.region = region
+        self.augmenter = HolographicAugmenter(bank_size=bank_size, region=region)
+
+    def prepare(self, width, height):
+        """Construit les banques de calques d'une taille d'image (avant de lancer les workers)"""
+        if self.bank_size > 0:
+            x0, y0, x1, y1 = self.augmenter.effect_region((height, width))[0]
+            for intensity in self.intensity:
+                self.augmenter.overlay_bank(x1 - x0, y1 - y0, intensity)
+
+    def _augment_batch_(self, batch, random_state, parents, hooks):
+        if batch.images is None:
+            return batch
+        # HolographicAugmenter tire ses paramètres dans le module random : une graine
+        # par image issue du RNG imgaug garde la sortie reproductible
+        seeds = random_state.generate_seeds_(len(batch.images))
+        levels = random_state.integers(0, len(self.intensity), size=len(batch.images))
+        state = random.getstate()
+        try:
+            for i, (seed, level) in enumerate(zip(seeds, levels)):
+                random.seed(int(seed))
+                batch.images[i] = self.augmenter.apply_holographic_effect(batch.images[i],
+                                                                          self.intensity[level])
+        finally:
+            random.setstate(state)
+        return batch
+
+    def get_parameters(self):
+        # Un masque est résumé par sa forme (repr courte et stable pour le hash du manifeste)
+        region = self.region.shape if isinstance(self.region, np.ndarray) else self.region
+        return [self.intensity, self.bank_size, region]
+
+
+# Pipeline effectivement appliqué : seq, précédé de l'effet holographique si --holo > 0
+pipeline = seq
+
+def configure_pipeline(holo_prob=0.0, holo_region="full"):
+    """
+    Insère l'effet holographique (probabilité holo_prob) avant seq : reflets et
+    arc-en-ciel font partie de la carte, flou, bruit et compression viennent ensuite.
+    Appelée aussi à l'initialisation des workers (le pipeline n'est pas hérité sous Windows).
+    """
+    global pipeline
+    if holo_prob > 0:
+        pipeline = iaa.Sequential([iaa.Sometimes(holo_prob, Holographic(region=holo_region)), seq])
+    else:
+        pipeline = seq
+    return pipeline
+
+def variation_seed(root_seed, base_name, index):
+    """
+    Entropie SeedSequence d'une variation (carte, index), dérivée de la graine
+    racine du run. Ne dépend ni de l'ordre de traitement ni du worker : la sortie
+    est identique quel que soit le nombre de processus.
+    """
+    return [root_seed, zlib.crc32(base_name.encode("utf-8")), index]
+
+def variation_rng(root_seed, base_name, index):
+    """RNG imgaug d'une variation (carte, index), voir variation_seed"""
+    return iarandom.RNG(np.random.SeedSequence(variation_seed(root_seed, base_name, index)))
+
+def output_names(base_name, index, ext=".png"):
+    """Noms (image, label) d'une variation augmentée"""
+    return f"{base_name}_aug_{index:03d}{ext}", f"{base_name}_aug_{index:03d}.txt"
+
+# ----- Manifeste pour l'augmentation incrémentale -----
+MANIFEST_NAME = "manifest.json"
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def pipeline_config_hash(batch_size, ext=".png", params=()):
+    """Empreinte de tout ce qui détermine les fichiers produits (hors source et graine)"""
+    # Adresses mémoire retirées (générateurs de matrices dans la repr de certains augmenteurs)
+    config = re.sub(r" at 0x[0-9a-fA-F]+", "", f"{pipeline}|{TARGET_SIZE}|{batch_size}|{ext}|{list(params)}")
+    return hashlib.sha1(config.encode("utf-8")).hexdigest()
+
+def load_manifest(manifest_path):
+    """
+    Charge le manifeste d'un run précédent. Chaque sortie y est décrite par le
+    hash de sa carte source, le hash de configuration du pipeline et sa graine.
+    """
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"root_seed": None, "outputs": {}}
+    if not isinstance(manifest.get("outputs"), dict):
+        return {"root_seed": None, "outputs": {}}
+    return manifest
+
+def save_manifest(manifest_path, manifest):
+    # Écriture atomique : un run interrompu ne laisse pas de manifeste tronqué
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def generate_variations(img, base_name, num_aug, root_seed, batch_size, starts):
+    """
+    Génère les lots de variations demandés pour une carte déjà redimensionnée.
+    Les variations sont empilées en lots uint8 (N, H, W, C) et passées en un seul
+    appel au pipeline, ce qui amortit le coût de dispatch de SomeOf.
+
+    Yields:
+        Tuples (index de variation, image augmentée)
+    """
+    for start in starts:
+        indices = range(start, min(start + batch_size, num_aug))
+        # RNG propre à (carte, première variation du lot) : le découpage en lots
+        # ne dépend que de --batch_size, la sortie reste reproductible et parallélisable
+        pipeline.seed_(variation_rng(root_seed, base_name, start))
+        batch = np.repeat(img[np.newaxis], len(indices), axis=0)
+        aug_batch = pipeline(images=batch)
+        for i, aug_img in zip(indices, aug_batch):
+            yield i, aug_img
+
+def augment_card(task):
+    """
+    Génère et écrit les lots de variations demandés pour une carte de base (images + labels YOLO).
+    Fonction de module pour pouvoir être exécutée dans un worker multiprocessing.
+
+    Returns:
+        Nombre d'images générées
+    """
+    (img_path, stack_file, row, class_id, num_aug, root_seed, batch_size, starts,
+     images_dir, labels_dir, ext, params) = task
+    img = load_stack_row(stack_file, row)
+    base_name = os.path.splitext(os.path.basename(img_path))[0]
+    annotation_line = f"{class_id} 0.5 0.5 1.0 1.0"
+    count = 0
+    for i, aug_img in generate_variations(img, base_name, num_aug, root_seed, batch_size, starts):
+        out_img_name, out_label_name = output_names(base_name, i, ext)
+        cv2.imwrite(os.path.join(images_dir, out_img_name), aug_img, params)
+        with open(os.path.join(labels_dir, out_label_name), "w") as f:
+            f.write(annotation_line)
+        count += 1
+    return count
+
+def augment_card_in_memory(task):
+    """
+    Variante de augment_card qui renvoie les variations au lieu de les écrire.
+
+    Returns:
+        Liste de tuples (image augmentée, nom de fichier virtuel)
+    """
+    img_path, stack_file, row, num_aug, root_seed, batch_size = task
+    img = load_stack_row(stack_file, row)
+    base_name = os.path.splitext(os.path.basename(img_path))[0]
+    starts = range(0, num_aug, batch_size)
+    return [(aug_img, output_names(base_name, i)[0])
+            for i, aug_img in generate_variations(img, base_name, num_aug, root_seed, batch_size, starts)]
+
+def iter_augmented_cards(num_aug=30, root_seed=None, batch_size=32, workers=1,
+                         base_dir=BASE_IMAGES_DIR, excel_path="cards_info.xlsx", holo_prob=0.0,
+                         holo_region="full"):
+    """
+    Génère les cartes augmentées en mémoire, sans PNG intermédiaires, pour être
+    consommées directement par mosaic.py (mode --stream). Les pixels sont
+    identiques à ceux d'un run disque avec les mêmes graine et --batch_size.
+
+    Yields:
+        Tuples (image augmentée, nom de fichier virtuel), comme resize_cards
+    """
+    _, class_map = load_card_data(excel_path)
+    if root_seed is None:
+        root_seed = np.random.SeedSequence().entropy
+    batch_size = max(1, batch_size)
+    image_paths = sorted(glob(os.path.join(base_dir, "*.jpg")) + glob(os.path.join(base_dir, "*.png")))
+    _, card_paths, stack_file = card_stack(image_paths, TARGET_SIZE)
+    tasks = []
+    for row, path in enumerate(card_paths):
+        card_number = extract_card_number(os.path.splitext(os.path.basename(path))[0])
+        if card_number is not None and card_number in class_map:
+            tasks.append((path, stack_file, row, num_aug, root_seed, batch_size))
+
+    configure_pipeline(holo_prob, holo_region)
+    workers = workers if workers > 0 else multiprocessing.cpu_count()
+    if workers > 1 and len(tasks) > 1:
+        _prepare_pipeline()
+        with multiprocessing.Pool(workers, initializer=_init_worker,
+                                  initargs=(holo_prob, holo_region)) as pool:
+            for variations in pool.imap(augment_card_in_memory, tasks):
+                yield from variations
+    else:
+        for task in tasks:
+            yield from augment_card_in_memory(task)
+
+def _prepare_pipeline():
+    # Banques de calques holographiques construites une fois, relues par mmap dans les workers
+    for augmenter in pipeline.get_all_children(flat=True):
+        if isinstance(augmenter, Holographic):
+            augmenter.prepare(*TARGET_SIZE)
+
+def _init_worker(holo_prob=0.0, holo_region="full"):
+    # Un seul thread OpenCV par worker pour éviter la sur-souscription des coeurs
+    cv2.setNumThreads(1)
+    configure_pipeline(holo_prob, holo_region)
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_pipeline(args.holo, args.holo_region)
+    AUG_OUTPUT_DIR, AUG_IMAGES_DIR, AUG_LABELS_DIR = get_output_dirs(args.target)
+    # Création des dossiers s'ils n'existent pas
+    os.makedirs(AUG_IMAGES_DIR, exist_ok=True)
+    os.makedirs(AUG_LABELS_DIR, exist_ok=True)
+
+    _, class_map = load_card_data("cards_info.xlsx")
     # Collecte des images de base depuis le répertoire "images"
     image_paths = []
     image_paths += glob(os.path.join(BASE_IMAGES_DIR, "*.jpg"))
     image_paths += glob(os.path.join(BASE_IMAGES_DIR, "*.png"))
-    resized_images = resize_cards(image_paths, TARGET_SIZE)
-    if not resized_images:
+    image_paths.sort()
+    # Cartes décodées une seule fois puis relues par mmap (partagé par les workers)
+    _, card_paths, stack_file = card_stack(image_paths, TARGET_SIZE)
+    if not card_paths:
         print("Aucune image valide trouvée dans le répertoire de base!")
         return
     NUM_AUG_PER_IMAGE = args.num_aug
-    aug_index = 1
-    for img, path in resized_images:
+    batch_size = max(1, args.batch_size)
+    manifest_path = os.path.join(AUG_OUTPUT_DIR, MANIFEST_NAME)
+    manifest = {"root_seed": None, "outputs": {}} if args.force else load_manifest(manifest_path)
+    # Graine racine du run : chaque variation en dérive son propre RNG.
+    # Sans --seed, on reprend celle du manifeste pour que les reruns soient incrémentaux.
+    root_seed = args.seed if args.seed is not None else manifest.get("root_seed")
+    if root_seed is None:
+        root_seed = np.random.SeedSequence().entropy
+    print(f"Graine racine : {root_seed} (--seed {root_seed} pour reproduire ce run)")
+    ext = IMAGE_FORMATS[args.format]
+    params = encode_params(args.format, args.quality, args.png_compression)
+    config_hash = pipeline_config_hash(batch_size, ext, params)
+    old_outputs = manifest["outputs"]
+    new_outputs = {}
+    tasks = []
+    to_generate = 0
+    for row, path in enumerate(card_paths):
         base_name = os.path.splitext(os.path.basename(path))[0]
         card_number = extract_card_number(base_name)
         if card_number is None or card_number not in class_map:
             continue
-        # Pour YOLO, la première classe (1 dans l'Excel) devient 0
-        class_id = class_map[card_number] - 1
-        for i in range(NUM_AUG_PER_IMAGE):
-            # Réinitialiser le seed aléatoire pour chaque augmentation (plus de variété)
-            np.random.seed(int(time.time() * 1000000) % (2**31) + i)
-            random.seed(int(time.time() * 1000000) % (2**31) + i)
-            
-            aug_img = seq(image=img)
-            out_img_name = f"{base_name}_aug_{i:03d}.png"
-            out_img_path = os.path.join(AUG_IMAGES_DIR, out_img_name)
-            cv2.imwrite(out_img_path, aug_img)
-            out_label_name = f"{base_name}_aug_{i:03d}.txt"
-            out_label_path = os.path.join(AUG_LABELS_DIR, out_label_name)
-            annotation_line = f"{class_id} 0.5 0.5 1.0 1.0"
-            with open(out_label_path, "w") as f:
-                f.write(annotation_line)
-            aug_index += 1
+        # Même ID que les labels des mosaïques (numéro de la carte)
+        class_id = class_map[card_number]
+        source_hash = file_hash(path)
+        # Un lot est régénéré dès qu'une de ses sorties manque ou est périmée
+        stale_starts = []
+        for start in range(0, NUM_AUG_PER_IMAGE, batch_size):
+            end = min(start + batch_size, NUM_AUG_PER_IMAGE)
+            stale = False
+            for i in range(start, end):
+                out_img_name, out_label_name = output_names(base_name, i, ext)
+                entry = {
+                    "source": path.replace(os.sep, "/"),
+                    "source_hash": source_hash,
+                    "config_hash": config_hash,
+                    "seed": variation_seed(root_seed, base_name, start),
+                    "batch": [start, end],
+                    "class_id": class_id,
+                    "label": out_label_name,
+                }
+                new_outputs[out_img_name] = entry
+                if (old_outputs.get(out_img_name) != entry
+                        or not os.path.exists(os.path.join(AUG_IMAGES_DIR, out_img_name))
+                        or not os.path.exists(os.path.join(AUG_LABELS_DIR, out_label_name))):
+                    stale = True
+            if stale:
+                stale_starts.append(start)
+                to_generate += end - start
+        if stale_starts:
+            tasks.append((path, stack_file, row, class_id, NUM_AUG_PER_IMAGE, root_seed, batch_size,
+                          stale_starts, AUG_IMAGES_DIR, AUG_LABELS_DIR, ext, params))
+
+    # Suppression des sorties d'un run précédent qui ne sont plus prévues
+    # (carte retirée, --num_aug réduit, --format changé)
+    removed = 0
+    for out_img_name, entry in old_outputs.items():
+        if out_img_name in new_outputs:
+            continue
+        for stale_path in (os.path.join(AUG_IMAGES_DIR, out_img_name),
+                           os.path.join(AUG_LABELS_DIR, entry.get("label", ""))):
+            if os.path.isfile(stale_path):
+                os.remove(stale_path)
+        removed += 1
+
+    print(f"{len(new_outputs) - to_generate} variations à jour, {to_generate} à générer, "
+          f"{removed} obsolètes supprimées")
+
+    workers = args.workers if args.workers > 0 else multiprocessing.cpu_count()
+    aug_count = 0
+    if workers > 1 and len(tasks) > 1:
+        print(f"Augmentation parallèle : {len(tasks)} cartes sur {workers} processus")
+        _prepare_pipeline()
+        with multiprocessing.Pool(workers, initializer=_init_worker,
+                                  initargs=(args.holo, args.holo_region)) as pool:
+            for count in pool.imap_unordered(augment_card, tasks):
+                aug_count += count
+    else:
+        for task in tasks:
+            aug_count += augment_card(task)
+
+    save_manifest(manifest_path, {"root_seed": root_seed, "outputs": new_outputs})
+
     yaml_path = os.path.join(AUG_OUTPUT_DIR, "data.yaml")
     with open(yaml_path, "w") as f:
+        f.write(f"# images: {ext} (encodage cv2.imwrite {params})\n")
         if args.target == "augmented":
             f.write("train: images\n")
             f.write("val: images\n")
         else:
             f.write("train: images_aug\n")
             f.write("val: images_aug\n")
-        nc = len(class_map)
-        f.write(f"nc: {nc}\n")
-        f.write("names:\n")
-        names_list = [None] * nc
-        for card_num, cid in class_map.items():
-            names_list[cid - 1] = card_dict[card_num]
-        for name in names_list:
-            f.write(f"  - {name}\n")
-    print(f"Dataset d'augmentation généré avec {aug_index - 1} images.")
+        for line in load_class_registry("cards_info.xlsx").yaml_lines():
+            f.write(f"{line}\n")
+    print(f"Dataset d'augmentation généré : {aug_count} nouvelles images, {len(new_outputs)} au total.")
     print(f"Le fichier YAML est situé à : {yaml_path}")
 
 if __name__ == "__main__":
+    # Nécessaire pour multiprocessing dans l'exécutable PyInstaller (Windows)
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Sources de fonds pour les mosaïques
+Le corpus web (background_mode 2) est téléchargé une fois par la commande prefetch,
+puis indexé sous forme de pile .npy memory-mappée à la taille du canevas : la
+génération des layouts ne dépend plus du réseau. Les fonds locaux (background_mode 1)
+sont servis par un BackgroundProvider qui garde les images décodées en mémoire.
+
+Usage:
+    python core/backgrounds.py prefetch --count 200       # remplit web/ depuis Lorem Picsum
+    python core/backgrounds.py index --dir mes_fonds/      # pré-indexe un dossier quelconque
+"""
+import os
+import sys
+import random
+import argparse
+import cv2
+import numpy as np
+from collections import OrderedDict
+from glob import glob
+from typing import List, Optional, Tuple
+
+try:
+    from .utils import safe_print
+    from .card_cache import card_stack, decode_card
+except ImportError:
+    from utils import safe_print
+    from card_cache import card_stack, decode_card
+
+# Corpus local du background_mode 2 (relatif au dossier de travail)
+WEB_DIR = "web"
+PICSUM_URL = "https://picsum.photos/{width}/{height}"
+BACKGROUND_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp", ".bmp"]
+# Budget mémoire par défaut des fonds décodés (par processus)
+DEFAULT_MEMORY_BUDGET_MB = 256
+# Index des corpus de fonds : dossier distinct du cache des cartes (ménage séparé)
+INDEX_CACHE_DIR = os.path.join(".cache", "web")
+# Les fonds locaux sont agrandis de ce facteur puis recadrés au hasard à la taille du canevas
+CROP_SCALE = 1.15
+
+
+def list_backgrounds(directory: str) -> List[str]:
+    """Images de fond d'un dossier (non récursif), triées"""
+    paths = []
+    for ext in BACKGROUND_EXTENSIONS:
+        paths += glob(os.path.join(directory, f"*{ext}"))
+        paths += glob(os.path.join(directory, f"*{ext.upper()}"))
+    return sorted(set(paths))
+
+
+def prefetch_backgrounds(count: int, output_dir: str = WEB_DIR, size: Tuple[int, int] = (1920, 1080),
+                         timeout: float = 10.0) -> int:
+    """
+    Télécharge des fonds aléatoires (Lorem Picsum) dans le corpus local
+
+    Args:
+        count: Nombre d'images à télécharger
+        output_dir: Dossier du corpus
+        size: Taille demandée (largeur, hauteur)
+        timeout: Timeout HTTP par image (secondes)
+
+    Returns:
+        Nombre d'images effectivement téléchargées
+    """
+    import requests  # Seule étape qui a besoin du réseau
+
+    os.makedirs(output_dir, exist_ok=True)
+    url = PICSUM_URL.format(width=size[0], height=size[1])
+    start = len(list_backgrounds(output_dir))
+    downloaded = 0
+    for i in range(count):
+        try:
+            resp = requests.get(url, timeout=timeout)
+        except requests.RequestException as e:
+            safe_print(f"Erreur lors du téléchargement du fond: {e}")
+            continue
+        if resp.status_code != 200:
+            safe_print(f"Erreur lors du téléchargement du fond: HTTP {resp.status_code}")
+            continue
+        filename = os.path.join(output_dir, f"background_{start + downloaded:05d}.jpg")
+        with open(filename, "wb") as f:
+            f.write(resp.content)
+        downloaded += 1
+        if downloaded % 20 == 0:
+            safe_print(f"  {downloaded}/{count} fonds téléchargés")
+    safe_print(f"{downloaded} fonds ajoutés à {output_dir}/ ({start + downloaded} au total)")
+    return downloaded
+
+
+class BackgroundIndex:
+    """
+    Fonds d'un dossier pré-redimensionnés à la taille du canevas, lus par mmap
+
+    L'index est une pile card_cache rangée dans INDEX_CACHE_DIR : il est reconstruit
+    automatiquement quand un fichier du dossier est ajouté ou modifié.
+    """
+
+    def __init__(self, directory: str, canvas_size: Tuple[int, int]):
+        """
+        Args:
+            directory: Dossier des fonds
+            canvas_size: Taille du canevas (largeur, hauteur)
+        """
+        self.directory = directory
+        self.canvas_size = tuple(canvas_size)
+        stack, self.paths, _ = card_stack(list_backgrounds(directory), target_size=self.canvas_size,
+                                          cache_dir=INDEX_CACHE_DIR)
+        self.stack: Optional[np.ndarray] = stack
+
+    def __len__(self) -> int:
+        return 0 if self.stack is None else len(self.stack)
+
+    def sample(self) -> Optional[np.ndarray]:
+        """Fond tiré au hasard (copie modifiable), None si le corpus est vide"""
+        if not len(self):
+            return None
+        return np.array(self.stack[random.randrange(len(self.stack))])
+
+
+class BackgroundProvider:
+    """
+    Fonds d'un dossier, indexés une fois et décodés à la demande
+
+    Chaque image est décodée et redimensionnée au plus une fois, puis gardée dans un
+    cache LRU borné par un budget mémoire. Chaque tirage renvoie un recadrage et un
+    miroir aléatoires, pour varier les fonds sans relire le disque.
+    """
+
+    def __init__(self, directory: str, canvas_size: Tuple[int, int],
+                 memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, crop_scale: float = CROP_SCALE):
+        """
+        Args:
+            directory: Dossier des fonds
+            canvas_size: Taille du canevas (largeur, hauteur)
+            memory_budget_mb: Mémoire maximale des fonds décodés (Mo)
+            crop_scale: Agrandissement avant recadrage (1.0 = pas de recadrage)
+        """
+        self.directory = directory
+        self.canvas_size = tuple(canvas_size)
+        self.paths = list_backgrounds(directory)
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        width, height = self.canvas_size
+        self.decoded_size = (max(width, int(round(width * crop_scale))), max(height, int(round(height * crop_scale))))
+        self._cache: "OrderedDict[str, Optional[np.ndarray]]" = OrderedDict()
+        self._cached_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _get(self, path: str) -> Optional[np.ndarray]:
+        if path in self._cache:
+            self._cache.move_to_end(path)
+            return self._cache[path]
+        img = decode_card(path, self.decoded_size)
+        # Les fichiers illisibles sont aussi mémorisés (None) pour ne pas être relus
+        self._cache[path] = img
+        self._cached_bytes += 0 if img is None else img.nbytes
+        while self._cached_bytes > self.memory_budget and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= 0 if evicted is None else evicted.nbytes
+        return img
+
+    def sample(self) -> Optional[np.ndarray]:
+        """Fond tiré au hasard, recadré et éventuellement retourné (copie modifiable), None si indisponible"""
+        if not self.paths:
+            return None
+        img = self._get(random.choice(self.paths))
+        if img is None:
+            return None
+        width, height = self.canvas_size
+        offset_x = random.randint(0, img.shape[1] - width)
+        offset_y = random.randint(0, img.shape[0] - height)
+        crop = img[offset_y:offset_y+height, offset_x:offset_x+width]
+        if random.random() < 0.5:
+            return cv2.flip(crop, 1)
+        return crop.copy()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Corpus local de fonds pour les mosaïques")
+    sub = parser.add_subparsers(dest="command", required=True)
+    prefetch = sub.add_parser("prefetch", help="Télécharge des fonds depuis Lorem Picsum")
+    prefetch.add_argument("--count", type=int, default=100, help="Nombre de fonds à télécharger (défaut: 100)")
+    prefetch.add_argument("--dir", default=WEB_DIR, help=f"Dossier du corpus (défaut: {WEB_DIR})")
+    prefetch.add_argument("--canvas", default="1920x1080", help="Taille de l'index construit ensuite (LxH)")
+    index = sub.add_parser("index", help="Indexe (décode et redimensionne) un dossier de fonds existant")
+    index.add_argument("--dir", default=WEB_DIR, help=f"Dossier des fonds (défaut: {WEB_DIR})")
+    index.add_argument("--canvas", default="1920x1080", help="Taille du canevas (LxH)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    canvas_size = tuple(int(v) for v in args.canvas.lower().split("x"))
+    if args.command == "prefetch":
+        prefetch_backgrounds(args.count, args.dir)
+    index = BackgroundIndex(args.dir, canvas_size)
+    safe_print(f"Index : {len(index)} fonds de {args.dir}/ en {canvas_size[0]}x{canvas_size[1]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Cache disque des cartes décodées et redimensionnées
+Les étapes du pipeline (augmentation, mosaïques, holographique) chargent les
+cartes depuis une pile .npy memory-mappée au lieu de re-décoder les PNG à chaque run
+"""
+import os
+import re
+import json
+import hashlib
+import cv2
+import numpy as np
+from typing import List, Tuple, Optional
+
+# Dossier du cache (relatif au dossier de travail, comme output/)
+CACHE_DIR = os.path.join(".cache", "cards")
+# Piles conservées : au plus MAX_STACKS et MAX_CACHE_MB au total, les moins
+# récemment utilisées sont supprimées
+MAX_STACKS = 8
+MAX_CACHE_MB = 8192
+# Seules les piles de card_stack (nom = clé) sont concernées par le ménage
+_KEY_PATTERN = re.compile(r"[0-9a-f]{40}\.npy")
+# Piles ouvertes par ce processus : jamais supprimées pendant le run
+_IN_USE = set()
+
+
+def decode_card(img_path: str, target_size: Optional[Tuple[int, int]]) -> Optional[np.ndarray]:
+    """
+    Décode une carte en BGR 3 canaux et la redimensionne (INTER_AREA)
+
+    Args:
+        img_path: Chemin de l'image
+        target_size: Taille cible (largeur, hauteur), None = taille native
+
+    Returns:
+        Image BGR uint8 ou None si illisible
+    """
+    img = cv2.imread(img_path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return None
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    elif img.shape[2] == 4:
+        # Image avec canal alpha, conversion en BGR
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+    if target_size is not None:
+        img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
+    return img
+
+
+def _stack_key(image_paths: List[str], target_size: Optional[Tuple[int, int]]) -> str:
+    """Clé de la pile : chemins + mtime + taille de chaque fichier, et taille cible"""
+    h = hashlib.sha1(repr(target_size).encode("utf-8"))
+    for path in image_paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        entry = (os.path.abspath(path), st.st_mtime_ns, st.st_size) if st else (os.path.abspath(path),)
+        h.update(repr(entry).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _touch(stack_file: str) -> None:
+    # Date d'utilisation : le ménage supprime les piles les moins récemment utilisées
+    for path in (stack_file, stack_file[:-4] + ".json"):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+def prune_stacks(cache_dir: str, keep: int = MAX_STACKS, max_mb: float = MAX_CACHE_MB,
+                 pattern=_KEY_PATTERN) -> None:
+    """
+    Supprime les piles les moins récemment utilisées d'un dossier de cache au-delà de
+    keep piles ou de max_mb Mo. Les piles ouvertes par ce processus sont conservées
+    (et comptées).
+
+    Args:
+        cache_dir: Dossier du cache
+        keep: Nombre maximal de piles
+        max_mb: Taille maximale totale des piles (Mo)
+        pattern: Noms des fichiers .npy concernés (les autres fichiers du dossier sont ignorés)
+    """
+    stacks = []
+    for name in os.listdir(cache_dir):
+        if pattern.fullmatch(name):
+            path = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stacks.append((st.st_mtime, st.st_size, path))
+    stacks.sort(reverse=True)
+    budget = max_mb * 1024 * 1024
+    count = 0
+    total = 0
+    for _, size, stack_file in stacks:
+        in_use = os.path.abspath(stack_file) in _IN_USE
+        # La plus récente est toujours gardée, même seule au-dessus du budget
+        if in_use or (count < keep and (count == 0 or total + size <= budget)):
+            count += 1
+            total += size
+            continue
+        for path in (stack_file, stack_file[:-4] + ".json"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def card_stack(image_paths: List[str], target_size: Optional[Tuple[int, int]] = (280, 380),
+               cache_dir: str = CACHE_DIR) -> Tuple[Optional[np.ndarray], List[str], Optional[str]]:
+    """
+    Renvoie les cartes décodées sous forme d'une pile (N, H, W, 3) memory-mappée
+
+    La pile est construite au premier appel puis relue par mmap tant qu'aucun
+    fichier n'a changé (chemin, mtime, taille). Les images illisibles sont ignorées.
+
+    Args:
+        image_paths: Chemins des cartes
+        target_size: Taille cible (largeur, hauteur), None = taille native
+            (la pile n'est alors possible que si toutes les cartes ont la même taille)
+        cache_dir: Dossier du cache
+
+    Returns:
+        Tuple (pile en lecture seule ou None, chemins des lignes de la pile, fichier .npy ou None)
+    """
+    if not image_paths:
+        return None, [], None
+    key = _stack_key(image_paths, target_size)
+    stack_file = os.path.join(cache_dir, key + ".npy")
+    index_file = stack_file[:-4] + ".json"
+    if os.path.exists(stack_file) and os.path.exists(index_file):
+        try:
+            with open(index_file, "r", encoding="utf-8") as f:
+                paths = json.load(f)
+            stack = np.load(stack_file, mmap_mode="r")
+            if len(stack) == len(paths):
+                _IN_USE.add(os.path.abspath(stack_file))
+                _touch(stack_file)
+                return stack, paths, stack_file
+        except (OSError, ValueError):
+            pass
+
+    # Pile écrite ligne par ligne au fil du décodage : jamais de copie complète en mémoire
+    os.makedirs(cache_dir, exist_ok=True)
+    _IN_USE.add(os.path.abspath(stack_file))
+    tmp_stack = f"{stack_file}.{os.getpid()}.tmp"
+    stack = None
+    stackable = True
+    paths = []
+    try:
+        for path in image_paths:
+            img = decode_card(path, target_size)
+            if img is None:
+                continue
+            if stack is None and stackable:
+                stack = _open_rows(tmp_stack, img, len(image_paths))
+            elif stackable and img.shape != stack.shape[1:]:
+                # Tailles hétérogènes (target_size=None) : pas de pile possible
+                stackable = False
+                stack = None
+            if stackable:
+                stack[len(paths)] = img
+            paths.append(path)
+        if stack is not None:
+            stack.flush()
+    except BaseException:
+        stack = None
+        _remove(tmp_stack)
+        raise
+    # Fermeture du mmap avant de déplacer le fichier (nécessaire sous Windows)
+    stack = None
+    if not stackable or not paths:
+        _remove(tmp_stack)
+        return None, paths, None
+    if len(paths) < len(image_paths):
+        # Images illisibles : pile ramenée au nombre de cartes décodées
+        _truncate_rows(tmp_stack, len(paths))
+
+    _publish(tmp_stack, stack_file, paths)
+    prune_stacks(cache_dir)
+    return np.load(stack_file, mmap_mode="r"), paths, stack_file
+
+
+def _open_rows(tmp_stack: str, first: np.ndarray, count: int) -> np.ndarray:
+    # Fichier .npy de count lignes de la forme de first, rempli ligne par ligne
+    return np.lib.format.open_memmap(tmp_stack, mode="w+", dtype=first.dtype, shape=(count,) + first.shape)
+
+
+def _truncate_rows(tmp_stack: str, count: int, chunk: int = 256) -> None:
+    # Recopie par blocs des count premières lignes dans un nouveau fichier
+    tmp_short = tmp_stack + ".short"
+    stack = np.load(tmp_stack, mmap_mode="r")
+    short = _open_rows(tmp_short, stack[0], count)
+    for start in range(0, count, chunk):
+        end = min(start + chunk, count)
+        short[start:end] = stack[start:end]
+    short.flush()
+    del short, stack
+    os.replace(tmp_short, tmp_stack)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _publish(tmp_stack: str, stack_file: str, paths: List[str]) -> None:
+    # Écriture atomique : un autre processus peut lire la même pile
+    os.replace(tmp_stack, stack_file)
+    index_file = stack_file[:-4] + ".json"
+    tmp_index = f"{index_file}.{os.getpid()}.tmp"
+    with open(tmp_index, "w", encoding="utf-8") as f:
+        json.dump(list(paths), f)
+    os.replace(tmp_index, index_file)
+
+
+def save_stack(stack_file: str, images: List[np.ndarray], paths: List[str]) -> None:
+    """
+    Écrit une pile (N, H, W, 3) et son index de chemins (.json à côté du .npy)
+
+    Args:
+        stack_file: Fichier .npy de destination
+        images: Images de même taille (séquence ou itérable, une par chemin), écrites
+            ligne par ligne sans copie de l'ensemble
+        paths: Chemin (ou nom) associé à chaque image
+    """
+    os.makedirs(os.path.dirname(stack_file) or ".", exist_ok=True)
+    _IN_USE.add(os.path.abspath(stack_file))
+    tmp_stack = f"{stack_file}.{os.getpid()}.tmp"
+    stack = None
+    try:
+        for i, img in enumerate(images):
+            if stack is None:
+                stack = _open_rows(tmp_stack, img, len(paths))
+            stack[i] = img
+        stack.flush()
+    except BaseException:
+        stack = None
+        _remove(tmp_stack)
+        raise
+    stack = None
+    _publish(tmp_stack, stack_file, paths)
+
+
+def open_stack(stack_file: str) -> List[Tuple[np.ndarray, str]]:
+    """Ouvre une pile existante par mmap (même format de retour que load_cards)"""
+    _IN_USE.add(os.path.abspath(stack_file))
+    with open(stack_file[:-4] + ".json", "r", encoding="utf-8") as f:
+        paths = json.load(f)
+    stack = np.load(stack_file, mmap_mode="r")
+    return [(stack[i], path) for i, path in enumerate(paths)]
+
+
+def load_cards(image_paths: List[str], target_size: Optional[Tuple[int, int]] = (280, 380),
+               cache_dir: str = CACHE_DIR) -> List[Tuple[np.ndarray, str]]:
+    """
+    Charge des cartes via le cache (même format de retour que resize_cards)
+
+    Args:
+        image_paths: Chemins des cartes
+        target_size: Taille cible (largeur, hauteur), None = taille native
+        cache_dir: Dossier du cache
+
+    Returns:
+        Liste de tuples (image BGR en lecture seule, chemin original)
+    """
+    stack, paths, _ = card_stack(image_paths, target_size, cache_dir)
+    if stack is None:
+        # Pas de pile (tailles hétérogènes) : décodage direct
+        return [(img, path) for path in paths
+                for img in [decode_card(path, target_size)] if img is not None]
+    return [(stack[i], path) for i, path in enumerate(paths)]
+
+
+def load_stack_row(stack_file: str, row: int) -> np.ndarray:
+    """Lit une carte d'une pile existante (utilisé par les workers multiprocessing)"""
+    return np.load(stack_file, mmap_mode="r")[row]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Registre des classes YOLO, compilé une fois depuis cards_info.xlsx
+Toutes les étapes (augmentation, mosaïques, utilitaires) partagent le même schéma
+d'ID : l'ID YOLO d'une carte est son numéro dans le set (001 → ID 1, 050 → ID 50),
+data.yaml déclare nc = plus grand ID + 1 avec "unused" pour l'ID 0.
+
+Le registre est mis en cache dans un petit JSON indexé par le chemin, la date de
+modification et la taille du fichier Excel : seule la première lecture après une
+modification de l'Excel passe par pandas.
+"""
+import os
+import json
+from functools import lru_cache
+from typing import Dict, List
+
+# Dossier du cache (relatif au dossier de travail, comme le cache des cartes)
+CACHE_DIR = os.path.join(".cache", "classes")
+EXCEL_FILE = "cards_info.xlsx"
+# Nom de la classe 0 (aucune carte ne porte le numéro 000)
+UNUSED_NAME = "unused"
+
+
+class ClassRegistry:
+    """Numéros de carte, noms et ID de classe YOLO"""
+
+    def __init__(self, cards: List[List[str]]):
+        """
+        Args:
+            cards: Paires [numéro sur 3 chiffres, nom], dans l'ordre de l'Excel
+        """
+        self.card_dict: Dict[str, str] = {}
+        self.class_map: Dict[str, int] = {}
+        for number, name in cards:
+            if number not in self.card_dict:
+                self.card_dict[number] = name
+                self.class_map[number] = int(number)
+
+    @property
+    def nc(self) -> int:
+        """Nombre de classes déclaré dans data.yaml (plus grand ID + 1)"""
+        return max(self.class_map.values()) + 1 if self.class_map else 0
+
+    def names(self) -> List[str]:
+        """Noms indexés par ID de classe ("unused" pour les ID sans carte)"""
+        names = [UNUSED_NAME] * self.nc
+        for number, class_id in self.class_map.items():
+            names[class_id] = self.card_dict[number]
+        return names
+
+    def yaml_lines(self) -> List[str]:
+        """Lignes nc/names de data.yaml"""
+        return [f"nc: {self.nc}", "names:"] + [f"  - {name}" for name in self.names()]
+
+
+def _read_excel(excel_path: str) -> List[List[str]]:
+    # Import tardif : pandas n'est nécessaire que pour reconstruire le registre
+    import pandas as pd
+    df = pd.read_excel(excel_path, usecols=["Set #", "Name"])
+    return [[str(number).split('/')[0].zfill(3), str(name).replace(" ", "_")]
+            for number, name in zip(df["Set #"], df["Name"])]
+
+
+def _cache_key(excel_path: str) -> str:
+    st = os.stat(excel_path)
+    return repr((os.path.abspath(excel_path), st.st_mtime_ns, st.st_size))
+
+
+@lru_cache(maxsize=4)
+def _load(excel_path: str, key: str, cache_dir: str) -> ClassRegistry:
+    cache_file = os.path.join(cache_dir, os.path.basename(excel_path) + ".json")
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return ClassRegistry(cached["cards"])
+    except (OSError, ValueError):
+        pass
+
+    cards = _read_excel(excel_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Écriture atomique : plusieurs étapes peuvent démarrer en même temps
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "cards": cards}, f, ensure_ascii=False)
+    os.replace(tmp_file, cache_file)
+    return ClassRegistry(cards)
+
+
+def load_class_registry(excel_path: str = EXCEL_FILE, cache_dir: str = CACHE_DIR) -> ClassRegistry:
+    """
+    Registre des classes de l'Excel (cache JSON, reconstruit si l'Excel a changé)
+
+    Raises:
+        FileNotFoundError: Si le fichier Excel n'existe pas
+    """
+    if not os.path.exists(excel_path):
+        raise FileNotFoundError(f"Fichier Excel non trouvé : {excel_path}")
+    return _load(excel_path, _cache_key(excel_path), cache_dir)
@@ -10,12 +10,16 @@ from pathlib import Path
 import shutil
 import zipfile
 from datetime import datetime
+import cv2
+import numpy as np
 
 # Import safe_print pour gérer l'encodage Unicode sur Windows
 try:
     from .utils import safe_print
+    from .shards import iter_samples, count_samples
 except ImportError:
     from utils import safe_print
+    from shards import iter_samples, count_samples
 
 
 class DatasetExporter:
@@ -26,7 +30,7 @@ class DatasetExporter:
         Initialise l'exporteur
         
         Args:
-            dataset_dir: Dossier contenant images/ et labels/
+            dataset_dir: Dossier contenant images/ et labels/ (ou shards/)
             class_names: Liste des noms de classes (optionnel)
         """
         self.dataset_dir = Path(dataset_dir)
@@ -60,33 +64,21 @@ class DatasetExporter:
             "annotations": []
         }
         
-        # Créer les catégories
+        # Catégories : toutes les classes présentes dans les labels
         unique_classes = set()
-        for label_file in self.labels_dir.glob("*.txt"):
-            with open(label_file, 'r') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if parts:
-                        unique_classes.add(int(parts[0]))
-        
-        for class_id in sorted(unique_classes):
-            coco_data["categories"].append({
-                "id": class_id,
-                "name": self.class_names.get(class_id, f"class_{class_id}"),
-                "supercategory": "pokemon_card"
-            })
-        
-        # Parcourir les images
-        image_files = list(self.images_dir.glob("*.png")) + \
-                      list(self.images_dir.glob("*.jpg")) + \
-                      list(self.images_dir.glob("*.jpeg"))
         
+        # Parcourir les images (un seul passage, dossiers ou shards)
         annotation_id = 1
         
-        for image_id, img_path in enumerate(image_files, 1):
+        for image_id, sample in enumerate(iter_samples(self.dataset_dir), 1):
+            if sample.label is not None:
+                for line in sample.label.splitlines():
+                    parts = line.strip().split()
+                    if parts:
+                        unique_classes.add(int(parts[0]))
+            
             # Lire les dimensions de l'image
-            import cv2
-            img = cv2.imread(str(img_path))
+            img = cv2.imdecode(np.frombuffer(sample.image, dtype=np.uint8), cv2.IMREAD_COLOR)
             if img is None:
                 continue
             
@@ -95,43 +87,48 @@ class DatasetExporter:
             # Ajouter l'image
             coco_data["images"].append({
                 "id": image_id,
-                "file_name": img_path.name,
+                "file_name": sample.name,
                 "width": width,
                 "height": height
             })
             
             # Lire les annotations
-            label_path = self.labels_dir / (img_path.stem + ".txt")
-            if not label_path.exists():
+            if sample.label is None:
                 continue
             
-            with open(label_path, 'r') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) != 5:
-                        continue
-                    
-                    class_id = int(parts[0])
-                    x_center = float(parts[1]) * width
-                    y_center = float(parts[2]) * height
-                    bbox_width = float(parts[3]) * width
-                    bbox_height = float(parts[4]) * height
-                    
-                    # COCO utilise [x_min, y_min, width, height]
-                    x_min = x_center - bbox_width / 2
-                    y_min = y_center - bbox_height / 2
-                    
-                    coco_data["annotations"].append({
-                        "id": annotation_id,
-                        "image_id": image_id,
-                        "category_id": class_id,
-                        "bbox": [x_min, y_min, bbox_width, bbox_height],
-                        "area": bbox_width * bbox_height,
-                        "iscrowd": 0
-                    })
-                    
-                    annotation_id += 1
-        
+            for line in sample.label.splitlines():
+                parts = line.strip().split()
+                if len(parts) != 5:
+                    continue
+                
+                class_id = int(parts[0])
+                x_center = float(parts[1]) * width
+                y_center = float(parts[2]) * height
+                bbox_width = float(parts[3]) * width
+                bbox_height = float(parts[4]) * height
+                
+                # COCO utilise [x_min, y_min, width, height]
+                x_min = x_center - bbox_width / 2
+                y_min = y_center - bbox_height / 2
+                
+                coco_data["annotations"].append({
+                    "id": annotation_id,
+                    "image_id": image_id,
+                    "category_id": class_id,
+                    "bbox": [x_min, y_min, bbox_width, bbox_height],
+                    "area": bbox_width * bbox_height,
+                    "iscrowd": 0
+                })
+                
+                annotation_id += 1
+
+        for class_id in sorted(unique_classes):
+            coco_data["categories"].append({
+                "id": class_id,
+                "name": self.class_names.get(class_id, f"class_{class_id}"),
+                "supercategory": "pokemon_card"
+            })
+
         # Sauvegarder
         with open(output_path, 'w') as f:
             json.dump(coco_data, f, indent=2)
@@ -162,17 +159,12 @@ class DatasetExporter:
         annotations_dir.mkdir(parents=True, exist_ok=True)
         images_out_dir.mkdir(parents=True, exist_ok=True)
         
-        image_files = list(self.images_dir.glob("*.png")) + \
-                      list(self.images_dir.glob("*.jpg")) + \
-                      list(self.images_dir.glob("*.jpeg"))
-        
-        for img_path in image_files:
+        for sample in iter_samples(self.dataset_dir):
             # Copier l'image
-            shutil.copy(img_path, images_out_dir / img_path.name)
+            (images_out_dir / sample.name).write_bytes(sample.image)
             
             # Lire les dimensions
-            import cv2
-            img = cv2.imread(str(img_path))
+            img = cv2.imdecode(np.frombuffer(sample.image, dtype=np.uint8), cv2.IMREAD_COLOR)
             if img is None:
                 continue
             
@@ -182,7 +174,7 @@ class DatasetExporter:
             annotation = ET.Element("annotation")
             
             ET.SubElement(annotation, "folder").text = "JPEGImages"
-            ET.SubElement(annotation, "filename").text = img_path.name
+            ET.SubElement(annotation, "filename").text = sample.name
             
             size = ET.SubElement(annotation, "size")
             ET.SubElement(size, "width").text = str(width)
@@ -190,42 +182,40 @@ class DatasetExporter:
             ET.SubElement(size, "depth").text = str(depth)
             
             # Lire les annotations YOLO
-            label_path = self.labels_dir / (img_path.stem + ".txt")
-            if not label_path.exists():
+            if sample.label is None:
                 continue
             
-            with open(label_path, 'r') as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) != 5:
-                        continue
-                    
-                    class_id = int(parts[0])
-                    x_center = float(parts[1]) * width
-                    y_center = float(parts[2]) * height
-                    bbox_width = float(parts[3]) * width
-                    bbox_height = float(parts[4]) * height
-                    
-                    xmin = int(x_center - bbox_width / 2)
-                    ymin = int(y_center - bbox_height / 2)
-                    xmax = int(x_center + bbox_width / 2)
-                    ymax = int(y_center + bbox_height / 2)
-                    
-                    obj = ET.SubElement(annotation, "object")
-                    ET.SubElement(obj, "name").text = self.class_names.get(class_id, f"class_{class_id}")
-                    ET.SubElement(obj, "pose").text = "Unspecified"
-                    ET.SubElement(obj, "truncated").text = "0"
-                    ET.SubElement(obj, "difficult").text = "0"
-                    
-                    bndbox = ET.SubElement(obj, "bndbox")
-                    ET.SubElement(bndbox, "xmin").text = str(xmin)
-                    ET.SubElement(bndbox, "ymin").text = str(ymin)
-                    ET.SubElement(bndbox, "xmax").text = str(xmax)
-                    ET.SubElement(bndbox, "ymax").text = str(ymax)
+            for line in sample.label.splitlines():
+                parts = line.strip().split()
+                if len(parts) != 5:
+                    continue
+                
+                class_id = int(parts[0])
+                x_center = float(parts[1]) * width
+                y_center = float(parts[2]) * height
+                bbox_width = float(parts[3]) * width
+                bbox_height = float(parts[4]) * height
+                
+                xmin = int(x_center - bbox_width / 2)
+                ymin = int(y_center - bbox_height / 2)
+                xmax = int(x_center + bbox_width / 2)
+                ymax = int(y_center + bbox_height / 2)
+                
+                obj = ET.SubElement(annotation, "object")
+                ET.SubElement(obj, "name").text = self.class_names.get(class_id, f"class_{class_id}")
+                ET.SubElement(obj, "pose").text = "Unspecified"
+                ET.SubElement(obj, "truncated").text = "0"
+                ET.SubElement(obj, "difficult").text = "0"
+                
+                bndbox = ET.SubElement(obj, "bndbox")
+                ET.SubElement(bndbox, "xmin").text = str(xmin)
+                ET.SubElement(bndbox, "ymin").text = str(ymin)
+                ET.SubElement(bndbox, "xmax").text = str(xmax)
+                ET.SubElement(bndbox, "ymax").text = str(ymax)
             
             # Sauvegarder le XML
             tree = ET.ElementTree(annotation)
-            xml_path = annotations_dir / (img_path.stem + ".xml")
+            xml_path = annotations_dir / (Path(sample.name).stem + ".xml")
             tree.write(xml_path, encoding='utf-8', xml_declaration=True)
         
         safe_print(f"✅ Export Pascal VOC terminé: {output_dir}")
@@ -258,28 +248,25 @@ class DatasetExporter:
         (valid_dir / "images").mkdir(parents=True, exist_ok=True)
         (valid_dir / "labels").mkdir(parents=True, exist_ok=True)
         
-        # Split 80/20
-        image_files = list(self.images_dir.glob("*.png")) + \
-                      list(self.images_dir.glob("*.jpg")) + \
-                      list(self.images_dir.glob("*.jpeg"))
+        # Split 80/20 (tirage sur les positions : les images sont lues une seule fois, dans l'ordre)
+        order = list(range(count_samples(self.dataset_dir)))
         
         import random
-        random.shuffle(image_files)
-        split_idx = int(len(image_files) * 0.8)
+        random.shuffle(order)
+        split_idx = int(len(order) * 0.8)
         
-        train_images = image_files[:split_idx]
-        valid_images = image_files[split_idx:]
+        train_images = order[:split_idx]
+        valid_images = set(order[split_idx:])
         
         # Copier les fichiers
-        for img_list, split_dir in [(train_images, train_dir), (valid_images, valid_dir)]:
-            for img_path in img_list:
-                # Copier image
-                shutil.copy(img_path, split_dir / "images" / img_path.name)
-                
-                # Copier label
-                label_path = self.labels_dir / (img_path.stem + ".txt")
-                if label_path.exists():
-                    shutil.copy(label_path, split_dir / "labels" / (img_path.stem + ".txt"))
+        for position, sample in enumerate(iter_samples(self.dataset_dir)):
+            split_dir = valid_dir if position in valid_images else train_dir
+            # Copier image
+            (split_dir / "images" / sample.name).write_bytes(sample.image)
+            
+            # Copier label
+            if sample.label is not None:
+                (split_dir / "labels" / (Path(sample.name).stem + ".txt")).write_text(sample.label)
         
         # Créer data.yaml
         yaml_content = f"""train: train/images
@@ -14,8 +14,10 @@ from datetime import datetime
 # Import safe_print pour gérer l'encodage Unicode sur Windows
 try:
     from .utils import safe_print
+    from .shards import find_shard_dir, count_samples, iter_samples
 except ImportError:
     from utils import safe_print
+    from shards import find_shard_dir, count_samples, iter_samples
 
 
 class DatasetValidator:
@@ -26,7 +28,7 @@ class DatasetValidator:
         Initialise le validateur
         
         Args:
-            dataset_dir: Chemin vers le dossier contenant images/ et labels/
+            dataset_dir: Chemin vers le dossier contenant images/ et labels/ (ou shards/)
         """
         self.dataset_dir = Path(dataset_dir)
         self.images_dir = self.dataset_dir / "images"
@@ -56,26 +58,28 @@ class DatasetValidator:
         safe_print(f"📁 Dataset: {self.dataset_dir}")
         safe_print()
         
-        if not self.images_dir.exists():
-            raise FileNotFoundError(f"❌ Dossier images/ non trouvé: {self.images_dir}")
-        
-        if not self.labels_dir.exists():
-            raise FileNotFoundError(f"❌ Dossier labels/ non trouvé: {self.labels_dir}")
+        shard_dir = find_shard_dir(self.dataset_dir)
+        if shard_dir is not None:
+            safe_print(f"📦 Dataset en shards tar: {shard_dir}")
+        else:
+            if not self.images_dir.exists():
+                raise FileNotFoundError(f"❌ Dossier images/ non trouvé: {self.images_dir}")
+            
+            if not self.labels_dir.exists():
+                raise FileNotFoundError(f"❌ Dossier labels/ non trouvé: {self.labels_dir}")
         
-        # 1. Lister toutes les images
-        image_files = list(self.images_dir.glob("*.png")) + \
-                      list(self.images_dir.glob("*.jpg")) + \
-                      list(self.images_dir.glob("*.jpeg"))
+        # 1. Compter toutes les images
+        total = count_samples(self.dataset_dir)
         
-        self.results['total_images'] = len(image_files)
-        safe_print(f"📊 {len(image_files)} images trouvées")
+        self.results['total_images'] = total
+        safe_print(f"📊 {total} images trouvées")
         
-        # 2. Valider chaque image
-        for idx, img_path in enumerate(image_files, 1):
+        # 2. Valider chaque image (lecture séquentielle, dossiers ou shards)
+        for idx, sample in enumerate(iter_samples(self.dataset_dir), 1):
             if idx % 100 == 0:
-                safe_print(f"   Progression: {idx}/{len(image_files)} images...")
+                safe_print(f"   Progression: {idx}/{total} images...")
             
-            self._validate_image(img_path)
+            self._validate_image(sample)
         
         # 3. Analyser les résultats
         self._analyze_results()
@@ -85,34 +89,33 @@ class DatasetValidator:
         
         return self.results
     
-    def _validate_image(self, img_path):
-        """Valide une image et son annotation"""
+    def _validate_image(self, sample):
+        """Valide une image et son annotation (Sample de shards.iter_samples)"""
         # 1. Vérifier que l'image n'est pas corrompue
         try:
-            img = cv2.imread(str(img_path))
+            img = cv2.imdecode(np.frombuffer(sample.image, dtype=np.uint8), cv2.IMREAD_COLOR)
             if img is None:
-                self.results['corrupted_images'].append(str(img_path))
-                self.results['errors'].append(f"Image corrompue: {img_path.name}")
+                self.results['corrupted_images'].append(sample.source)
+                self.results['errors'].append(f"Image corrompue: {sample.name}")
                 return
             
             img_h, img_w = img.shape[:2]
         except Exception as e:
-            self.results['corrupted_images'].append(str(img_path))
-            self.results['errors'].append(f"Erreur lecture {img_path.name}: {str(e)}")
+            self.results['corrupted_images'].append(sample.source)
+            self.results['errors'].append(f"Erreur lecture {sample.name}: {str(e)}")
             return
         
         # 2. Vérifier l'existence du fichier label
-        label_path = self.labels_dir / (img_path.stem + ".txt")
+        label_path = Path(sample.label_source)
         
-        if not label_path.exists():
-            self.results['missing_labels'].append(str(img_path))
-            self.results['warnings'].append(f"Label manquant pour: {img_path.name}")
+        if sample.label is None:
+            self.results['missing_labels'].append(sample.source)
+            self.results['warnings'].append(f"Label manquant pour: {sample.name}")
             return
         
         # 3. Valider les annotations
         try:
-            with open(label_path, 'r') as f:
-                lines = f.readlines()
+            lines = sample.label.splitlines()
             
             self.results['total_labels'] += 1
             
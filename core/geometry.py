@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Géométrie vectorisée des layouts : coins des cartes, projections et labels YOLO
+Les fonctions travaillent sur des tableaux NumPy (une ligne par carte) au lieu de
+boucles Python point par point. Les mêmes polygones donnent les boîtes englobantes,
+les labels de segmentation et les boîtes orientées (OBB). OccupancyGrid suit les
+recouvrements entre cartes pour le placement dense (layout_mode 4).
+"""
+import numpy as np
+from typing import List, Sequence, Tuple
+
+
+def card_corners(sizes) -> np.ndarray:
+    """
+    Coins (haut-gauche, haut-droit, bas-droit, bas-gauche) de cartes non transformées
+
+    Args:
+        sizes: (largeur, hauteur) d'une carte, ou tableau (N, 2)
+
+    Returns:
+        Tableau float64 (4, 2) pour une carte, (N, 4, 2) pour N cartes
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    w = sizes[..., 0, None]
+    h = sizes[..., 1, None]
+    zeros = np.zeros_like(w)
+    xs = np.concatenate([zeros, w, w, zeros], axis=-1)
+    ys = np.concatenate([zeros, zeros, h, h], axis=-1)
+    return np.stack([xs, ys], axis=-1)
+
+
+def rotation_3d(theta: float, phi: float) -> np.ndarray:
+    """Matrice de rotation R_y(theta) @ R_x(phi), angles en degrés"""
+    theta_rad = np.deg2rad(theta)
+    phi_rad = np.deg2rad(phi)
+    R_x = np.array([[1, 0, 0],
+                    [0, np.cos(phi_rad), -np.sin(phi_rad)],
+                    [0, np.sin(phi_rad), np.cos(phi_rad)]])
+    R_y = np.array([[np.cos(theta_rad), 0, np.sin(theta_rad)],
+                    [0, 1, 0],
+                    [-np.sin(theta_rad), 0, np.cos(theta_rad)]])
+    return R_y @ R_x
+
+
+def project_corners(w: int, h: int, theta: float, phi: float) -> np.ndarray:
+    """
+    Projection perspective des 4 coins d'une carte w x h inclinée de theta/phi degrés
+    (focale = plus grand côté, carte posée dans le plan Z=0)
+
+    Returns:
+        Tableau float32 (4, 2) des coins projetés (non recentrés)
+    """
+    corners_3d = np.zeros((4, 3), dtype=np.float32)
+    corners_3d[:, :2] = card_corners((w, h))
+    rotated = np.dot(corners_3d, rotation_3d(theta, phi).T)
+    f = 1.0 * max(w, h)
+    factor = f / (rotated[:, 2] + f)
+    return (rotated[:, :2] * factor[:, None]).astype(np.float32)
+
+
+def affine_corners(sizes, matrices) -> np.ndarray:
+    """
+    Applique une transformation affine 2x3 par carte à ses coins
+
+    Args:
+        sizes: (N, 2) largeur/hauteur des cartes
+        matrices: (N, 2, 3) matrices affines (cv2.getRotationMatrix2D...)
+
+    Returns:
+        Tableau float64 (N, 4, 2)
+    """
+    corners = card_corners(sizes)
+    matrices = np.asarray(matrices, dtype=np.float64)
+    return np.einsum("nkj,nij->nki", corners, matrices[:, :, :2]) + matrices[:, None, :, 2]
+
+
+def polygons_to_yolo(class_ids: Sequence[int], polygons: np.ndarray, canvas_width: int,
+                     canvas_height: int, clip: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convertit des polygones (coordonnées pixel du canevas) en labels YOLO normalisés
+
+    Les coordonnées sont tronquées au pixel entier, puis les boîtes englobantes sont
+    rognées au canevas (cartes partiellement hors champ). Les boîtes entièrement hors
+    du canevas sont écartées.
+
+    Args:
+        class_ids: ID de classe de chaque polygone
+        polygons: Tableau (N, K, 2) des sommets
+        canvas_width: Largeur du canevas
+        canvas_height: Hauteur du canevas
+        clip: Rogner les boîtes au canevas
+
+    Returns:
+        Tuple (labels (M, 5) [classe, cx, cy, w, h], masque (N,) des polygones conservés)
+    """
+    polygons = np.asarray(polygons, dtype=np.float64).reshape(len(class_ids), -1, 2).astype(np.int64)
+    mins = polygons.min(axis=1)
+    maxs = polygons.max(axis=1)
+    if clip:
+        limits = np.array([canvas_width, canvas_height])
+        mins = np.clip(mins, 0, limits)
+        maxs = np.clip(maxs, 0, limits)
+    keep = (maxs > mins).all(axis=1)
+    scale = np.array([canvas_width, canvas_height], dtype=np.float64)
+    centers = (mins + maxs) / 2 / scale
+    extents = (maxs - mins) / scale
+    labels = np.column_stack([np.asarray(class_ids, dtype=np.float64), centers, extents])
+    return labels[keep], keep
+
+
+def format_yolo_labels(labels: np.ndarray) -> List[str]:
+    """Lignes texte YOLO ("classe cx cy w h", 6 décimales) d'un tableau (N, 5)"""
+    return [f"{int(c)} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}" for c, cx, cy, w, h in labels]
+
+
+def clip_polygon(polygon: np.ndarray, canvas_width: int, canvas_height: int) -> np.ndarray:
+    """
+    Rogne un polygone convexe au canevas (Sutherland-Hodgman sur les 4 bords)
+
+    Returns:
+        Tableau float64 (K, 2) des sommets, vide si le polygone est hors du canevas
+    """
+    points = np.asarray(polygon, dtype=np.float64)
+    # Demi-plans (axe, limite, côté) : x >= 0, x <= W, y >= 0, y <= H
+    for axis, limit, sign in ((0, 0, 1), (0, canvas_width, -1), (1, 0, 1), (1, canvas_height, -1)):
+        if not len(points):
+            break
+        inside = sign * (points[:, axis] - limit) >= 0
+        if inside.all():
+            continue
+        nxt = np.roll(points, -1, axis=0)
+        nxt_inside = np.roll(inside, -1)
+        clipped = []
+        for p, q, p_in, q_in in zip(points, nxt, inside, nxt_inside):
+            if p_in:
+                clipped.append(p)
+            if p_in != q_in:
+                t = (limit - p[axis]) / (q[axis] - p[axis])
+                clipped.append(p + t * (q - p))
+        points = np.array(clipped).reshape(-1, 2)
+    return points
+
+
+def min_area_rect(points: np.ndarray) -> np.ndarray:
+    """
+    Rectangle orienté d'aire minimale contenant un polygone convexe (un côté du
+    rectangle porte toujours une arête du polygone : toutes les arêtes sont testées à la fois)
+
+    Returns:
+        Tableau float64 (4, 2) des coins, dans l'ordre du contour
+    """
+    points = np.asarray(points, dtype=np.float64)
+    edges = np.roll(points, -1, axis=0) - points
+    edges = edges[np.hypot(edges[:, 0], edges[:, 1]) > 1e-9]
+    if not len(edges):
+        return np.repeat(points[:1], 4, axis=0)
+    angles = np.arctan2(edges[:, 1], edges[:, 0])
+    cos, sin = np.cos(angles), np.sin(angles)
+    # Points exprimés dans le repère de chaque arête : (E, K, 2)
+    u = points[None, :, 0] * cos[:, None] + points[None, :, 1] * sin[:, None]
+    v = -points[None, :, 0] * sin[:, None] + points[None, :, 1] * cos[:, None]
+    u0, u1, v0, v1 = u.min(axis=1), u.max(axis=1), v.min(axis=1), v.max(axis=1)
+    best = np.argmin((u1 - u0) * (v1 - v0))
+    c, s = cos[best], sin[best]
+    corners_uv = np.array([[u0[best], v0[best]], [u1[best], v0[best]], [u1[best], v1[best]], [u0[best], v1[best]]])
+    return np.column_stack([corners_uv[:, 0] * c - corners_uv[:, 1] * s,
+                            corners_uv[:, 0] * s + corners_uv[:, 1] * c])
+
+
+def polygons_to_yolo_seg(class_ids: Sequence[int], polygons: np.ndarray, canvas_width: int,
+                         canvas_height: int) -> Tuple[List[str], np.ndarray]:
+    """
+    Labels de segmentation YOLO ("classe x1 y1 x2 y2 ...", normalisés) des polygones
+    rognés au canevas
+
+    Returns:
+        Tuple (lignes texte, masque (N,) des polygones conservés)
+    """
+    scale = np.array([canvas_width, canvas_height], dtype=np.float64)
+    lines = []
+    keep = np.zeros(len(class_ids), dtype=bool)
+    for k, (class_id, polygon) in enumerate(zip(class_ids, polygons)):
+        clipped = clip_polygon(polygon, canvas_width, canvas_height)
+        if len(clipped) < 3:
+            continue
+        coords = " ".join(f"{v:.6f}" for v in (clipped / scale).ravel())
+        lines.append(f"{int(class_id)} {coords}")
+        keep[k] = True
+    return lines, keep
+
+
+def polygons_to_yolo_obb(class_ids: Sequence[int], polygons: np.ndarray, canvas_width: int,
+                         canvas_height: int) -> Tuple[List[str], np.ndarray]:
+    """
+    Labels de boîtes orientées YOLO-OBB ("classe x1 y1 x2 y2 x3 y3 x4 y4", normalisés)
+
+    Une carte tournée en 2D est déjà un rectangle (boîte exacte) ; une carte projetée
+    en 3D est un quadrilatère, remplacé par son rectangle d'aire minimale. Les parties
+    hors du canevas sont rognées avant le calcul du rectangle.
+
+    Returns:
+        Tuple (lignes texte, masque (N,) des polygones conservés)
+    """
+    scale = np.array([canvas_width, canvas_height], dtype=np.float64)
+    lines = []
+    keep = np.zeros(len(class_ids), dtype=bool)
+    for k, (class_id, polygon) in enumerate(zip(class_ids, polygons)):
+        clipped = clip_polygon(polygon, canvas_width, canvas_height)
+        if len(clipped) < 3:
+            continue
+        corners = np.clip(min_area_rect(clipped) / scale, 0.0, 1.0)
+        coords = " ".join(f"{v:.6f}" for v in corners.ravel())
+        lines.append(f"{int(class_id)} {coords}")
+        keep[k] = True
+    return lines, keep
+
+
+class OccupancyGrid:
+    """
+    Carte d'occupation du canevas pour le placement dense des cartes
+
+    Chaque pixel contient l'indice de la carte visible à cet endroit (-1 = fond).
+    Les cartes posées ensuite recouvrent les précédentes : la fraction visible de
+    chaque carte se lit directement dans la carte d'occupation.
+    """
+
+    def __init__(self, canvas_width: int, canvas_height: int, alpha_threshold: int = 127):
+        self.owner = np.full((canvas_height, canvas_width), -1, dtype=np.int16)
+        self.alpha_threshold = alpha_threshold
+        self.areas: List[int] = []
+
+    def _window(self, mask: np.ndarray, x: int, y: int):
+        # Parties du masque et de la carte d'occupation qui se recouvrent (rognées au canevas)
+        h, w = mask.shape[:2]
+        canvas_h, canvas_w = self.owner.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, canvas_w), min(y + h, canvas_h)
+        if x1 <= x0 or y1 <= y0:
+            return None, None
+        return (mask[y0 - y:y1 - y, x0 - x:x1 - x] > self.alpha_threshold), self.owner[y0:y1, x0:x1]
+
+    def overlap(self, mask: np.ndarray, x: int, y: int) -> float:
+        """Fraction des pixels opaques de mask (posé en x, y) qui recouvriraient une carte existante"""
+        area = np.count_nonzero(mask > self.alpha_threshold)
+        if area == 0:
+            return 0.0
+        inside, owner = self._window(mask, x, y)
+        if inside is None:
+            return 0.0
+        return np.count_nonzero(inside & (owner >= 0)) / area
+
+    def place(self, mask: np.ndarray, x: int, y: int) -> int:
+        """Pose une carte (masque alpha uint8) en x, y ; renvoie son indice"""
+        index = len(self.areas)
+        self.areas.append(int(np.count_nonzero(mask > self.alpha_threshold)))
+        inside, owner = self._window(mask, x, y)
+        if inside is not None:
+            owner[inside] = index
+        return index
+
+    def visible_fractions(self) -> np.ndarray:
+        """Fraction visible de chaque carte posée (parties hors canevas comptées comme masquées)"""
+        counts = np.bincount(self.owner[self.owner >= 0].ravel(), minlength=len(self.areas))
+        return counts / np.maximum(np.array(self.areas, dtype=np.float64), 1)
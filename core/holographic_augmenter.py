@@ -2,7 +2,22 @@
 """
 Module d'augmentation holographique pour cartes Pokémon brillantes
 Simule les effets visuels des cartes holographiques (rainbow, glare, texture)
+
+Les calques (arc-en-ciel, reflets, texture) ne dépendent pas de la carte : avec une
+banque de calques (bank_size > 0, --bank), ils sont pré-calculés une fois par taille
+d'image et intensité, mis en cache sur disque, puis tournés et recadrés au hasard
+pour chaque image.
+
+Les effets peuvent être limités à une zone de la carte (region, --region/--mask) :
+rectangle de l'illustration d'une carte standard ou masque fourni. Seul ce rectangle
+est calculé, y compris la conversion HSV.
 """
+import os
+import zlib
+import queue
+import hashlib
+import threading
+import multiprocessing
 import cv2
 import numpy as np
 import random
@@ -10,15 +25,115 @@ import random
 # Import safe_print - gère import relatif ET absolu
 try:
     from .utils import safe_print
+    from .card_cache import card_stack, decode_card, load_stack_row, save_stack
 except ImportError:
     # Exécution directe du script
     from utils import safe_print
+    from card_cache import card_stack, decode_card, load_stack_row, save_stack
+
+# Paramètres par intensité : (arc-en-ciel, intensité des reflets, nombre de reflets, texture, aberration)
+INTENSITY_LEVELS = {
+    'light': (0.15, 0.3, 1, 0.1, 2),
+    'medium': (0.3, 0.5, 3, 0.2, 5),
+    'heavy': (0.5, 0.7, 5, 0.3, 8),
+}
+# Banque de calques : nombre de calques par (taille, intensité), cache disque
+OVERLAY_BANK_SIZE = 64
+OVERLAY_CACHE_DIR = os.path.join(".cache", "holographic")
+# Rotation aléatoire des calques (degrés, plus un demi-tour une fois sur deux)
+# et marge de recadrage autour de l'image
+OVERLAY_MAX_ROTATION = 20
+OVERLAY_MARGIN = 24
+# Les tailles d'image sont arrondies à ce pas : une banque sert toutes les images de
+# tailles voisines (cartes à leur taille native)
+OVERLAY_SIZE_STEP = 128
+# Images encodées en attente d'écriture (file du thread d'écriture)
+WRITE_QUEUE_SIZE = 64
+# Zones prédéfinies pour les effets, en fractions de la carte (x0, y0, x1, y1) ;
+# 'artwork' = cadre de l'illustration d'une carte standard (hors bordures, nom et texte)
+REGIONS = {
+    'full': None,
+    'artwork': (0.08, 0.10, 0.92, 0.48),
+}
+
+
+class OverlayBank:
+    """
+    Calques holographiques pré-calculés pour une taille d'image et une intensité
+
+    Chaque calque combine arc-en-ciel, reflets et texture sur fond noir, sur une
+    surface un peu plus grande que l'image : un tirage le tourne et le recadre au
+    hasard à la taille de l'image, puis il est ajouté à la carte (cv2.add).
+    """
+
+    def __init__(self, augmenter, width, height, intensity='medium', size=OVERLAY_BANK_SIZE,
+                 seed=0, cache_dir=OVERLAY_CACHE_DIR):
+        """
+        Args:
+            augmenter: HolographicAugmenter qui dessine les calques
+            width: Largeur maximale des images
+            height: Hauteur maximale des images
+            intensity: 'light', 'medium', 'heavy'
+            size: Nombre de calques
+            seed: Graine des calques (le cache disque en dépend)
+            cache_dir: Dossier du cache disque
+        """
+        self.width = width
+        self.height = height
+        # Surface couvrant l'image tournée de OVERLAY_MAX_ROTATION degrés, plus la marge de recadrage
+        rad = np.deg2rad(OVERLAY_MAX_ROTATION)
+        self.tile_width = int(np.ceil(width * np.cos(rad) + height * np.sin(rad))) + 2 * OVERLAY_MARGIN
+        self.tile_height = int(np.ceil(width * np.sin(rad) + height * np.cos(rad))) + 2 * OVERLAY_MARGIN
+        key = hashlib.sha1(repr((self.tile_width, self.tile_height, INTENSITY_LEVELS[intensity],
+                                 size, seed)).encode("utf-8")).hexdigest()
+        self.cache_file = os.path.join(cache_dir, f"overlays_{key}.npy")
+        if not os.path.exists(self.cache_file):
+            # Tirages des calques isolés de l'état aléatoire de l'appelant
+            state = random.getstate()
+            random.seed(seed)
+            try:
+                tiles = [augmenter.render_overlay(self.tile_width, self.tile_height, intensity)
+                         for _ in range(size)]
+            finally:
+                random.setstate(state)
+            save_stack(self.cache_file, tiles, [f"overlay_{k:03d}" for k in range(size)])
+        self.tiles = np.load(self.cache_file, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def sample(self, width=None, height=None):
+        """Calque tiré au hasard, tourné et recadré à width x height (par défaut la taille de la banque)"""
+        width = width or self.width
+        height = height or self.height
+        tile = self.tiles[random.randrange(len(self.tiles))]
+        angle = random.uniform(-OVERLAY_MAX_ROTATION, OVERLAY_MAX_ROTATION) + random.choice([0, 180])
+        center_x = self.tile_width / 2 + random.uniform(-OVERLAY_MARGIN, OVERLAY_MARGIN)
+        center_y = self.tile_height / 2 + random.uniform(-OVERLAY_MARGIN, OVERLAY_MARGIN)
+        # Transformation inverse : pixel de sortie -> pixel du calque (rotation autour du centre)
+        rad = np.deg2rad(angle)
+        rotation = np.array([[np.cos(rad), -np.sin(rad)], [np.sin(rad), np.cos(rad)]])
+        offset = np.array([center_x, center_y]) - rotation @ np.array([width / 2, height / 2])
+        M = np.hstack([rotation, offset[:, None]]).astype(np.float32)
+        return cv2.warpAffine(np.asarray(tile), M, (width, height),
+                              flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REFLECT)
 
 
 class HolographicAugmenter:
     """Ajoute des effets holographiques réalistes aux cartes"""
     
-    def __init__(self):
+    def __init__(self, bank_size=0, bank_seed=0, region=None):
+        """
+        Args:
+            bank_size: Calques pré-calculés par (taille, intensité) ; 0 = calques
+                générés pour chaque image
+            bank_seed: Graine des calques de la banque
+            region: Zone des effets par défaut, voir effect_region (None = toute l'image)
+        """
+        self.bank_size = bank_size
+        self.bank_seed = bank_seed
+        self.region = region
+        self._banks = {}
         self.rainbow_colors = [
             (148, 0, 211),    # Violet
             (75, 0, 130),     # Indigo
@@ -42,31 +157,28 @@ class HolographicAugmenter:
         Returns:
             Image RGB avec gradient arc-en-ciel
         """
-        # Créer une image vide
-        rainbow = np.zeros((height, width, 3), dtype=np.uint8)
+        colors = np.array(self.rainbow_colors)
+        last = len(colors) - 1
         
         # Angle en radians
         angle_rad = np.deg2rad(angle)
+        cos_a = np.cos(angle_rad)
+        sin_a = np.sin(angle_rad)
+        
+        # Position relative selon l'angle, pour tous les pixels à la fois (H, W)
+        cols = np.arange(width)
+        rows = np.arange(height)
+        pos = cols[None, :] * cos_a + rows[:, None] * sin_a
+        pos = pos / (width * cos_a + height * sin_a)
         
-        # Créer le gradient
-        for i in range(height):
-            for j in range(width):
-                # Position relative selon l'angle
-                pos = (j * np.cos(angle_rad) + i * np.sin(angle_rad))
-                pos = pos / (width * np.cos(angle_rad) + height * np.sin(angle_rad))
-                
-                # Mapper à la couleur
-                color_idx = int(pos * (len(self.rainbow_colors) - 1))
-                color_idx = max(0, min(color_idx, len(self.rainbow_colors) - 1))
-                
-                # Interpolation entre deux couleurs
-                next_idx = min(color_idx + 1, len(self.rainbow_colors) - 1)
-                t = (pos * (len(self.rainbow_colors) - 1)) - color_idx
-                
-                color1 = np.array(self.rainbow_colors[color_idx])
-                color2 = np.array(self.rainbow_colors[next_idx])
-                
-                rainbow[i, j] = color1 * (1 - t) + color2 * t
+        # Mapper à la couleur (troncature vers zéro puis bornage, comme int())
+        scaled = pos * last
+        color_idx = np.clip(scaled.astype(np.int64), 0, last)
+        
+        # Interpolation entre deux couleurs
+        next_idx = np.minimum(color_idx + 1, last)
+        t = (scaled - color_idx)[..., None]
+        rainbow = (colors[color_idx] * (1 - t) + colors[next_idx] * t).astype(np.uint8)
         
         # Appliquer l'intensité
         rainbow = (rainbow * intensity).astype(np.uint8)
@@ -96,13 +208,18 @@ class HolographicAugmenter:
             # Taille aléatoire
             radius = random.randint(50, 150)
             
-            # Créer un gradient radial
-            for i in range(h):
-                for j in range(w):
-                    dist = np.sqrt((j - cx)**2 + (i - cy)**2)
-                    if dist < radius:
-                        glare[i, j] = max(glare[i, j], 
-                                         (1 - dist / radius) * intensity)
+            # Créer un gradient radial, limité au carré qui contient le disque
+            x0, x1 = max(cx - radius, 0), min(cx + radius + 1, w)
+            y0, y1 = max(cy - radius, 0), min(cy + radius + 1, h)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            dx = np.arange(x0, x1) - cx
+            dy = np.arange(y0, y1) - cy
+            dist = np.sqrt(dx[None, :]**2 + dy[:, None]**2)
+            value = (1 - dist / radius) * intensity
+            window = glare[y0:y1, x0:x1]
+            brighter = (dist < radius) & (value > window)
+            window[brighter] = value[brighter]
         
         # Appliquer le glare
         glare_3ch = cv2.cvtColor((glare * 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
@@ -124,13 +241,12 @@ class HolographicAugmenter:
         """
         h, w = image.shape[:2]
         pattern = np.zeros((h, w), dtype=np.float32)
+        # Les lignes et les ondes ne dépendent que de i + j (diagonales)
+        diagonal = np.add.outer(np.arange(h), np.arange(w))
         
         if pattern_type == 'lines':
             # Lignes diagonales
-            for i in range(h):
-                for j in range(w):
-                    if (i + j) % 10 < 3:
-                        pattern[i, j] = intensity
+            pattern[diagonal % 10 < 3] = intensity
         
         elif pattern_type == 'dots':
             # Points hexagonaux
@@ -140,11 +256,9 @@ class HolographicAugmenter:
                     cv2.circle(pattern, (j + offset, i), 3, intensity, -1)
         
         elif pattern_type == 'waves':
-            # Ondes
-            for i in range(h):
-                for j in range(w):
-                    wave = np.sin((i + j) / 10.0) * intensity
-                    pattern[i, j] = max(0, wave)
+            # Ondes : une valeur par diagonale, puis recopiée sur l'image
+            wave = np.sin(np.arange(h + w - 1) / 10.0) * intensity
+            pattern[:] = np.maximum(wave, 0)[diagonal]
         
         # Appliquer le pattern
         pattern_3ch = cv2.cvtColor((pattern * 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
@@ -152,13 +266,14 @@ class HolographicAugmenter:
         
         return result
     
-    def add_chromatic_aberration(self, image, strength=5):
+    def add_chromatic_aberration(self, image, strength=5, border_mode=cv2.BORDER_CONSTANT):
         """
         Ajoute une aberration chromatique (effet prisme)
         
         Args:
             image: Image source
             strength: Force de l'aberration
+            border_mode: Bord des canaux décalés (BORDER_REPLICATE à l'intérieur d'une carte)
         
         Returns:
             Image avec aberration chromatique
@@ -172,61 +287,88 @@ class HolographicAugmenter:
         M_red = np.float32([[1, 0, strength], [0, 1, 0]])
         M_blue = np.float32([[1, 0, -strength], [0, 1, 0]])
         
-        r_shifted = cv2.warpAffine(r, M_red, (w, h))
-        b_shifted = cv2.warpAffine(b, M_blue, (w, h))
+        r_shifted = cv2.warpAffine(r, M_red, (w, h), borderMode=border_mode)
+        b_shifted = cv2.warpAffine(b, M_blue, (w, h), borderMode=border_mode)
         
         # Recombiner
         result = cv2.merge([b_shifted, g, r_shifted])
         
         return result
     
-    def apply_holographic_effect(self, image, intensity='medium'):
+    def effect_region(self, shape, region=None):
+        """
+        Rectangle où calculer les effets, et masque éventuel à l'intérieur
+
+        Args:
+            shape: Forme (hauteur, largeur, ...) de l'image
+            region: None (zone de l'augmenteur), nom de REGIONS, fractions
+                (x0, y0, x1, y1) de la carte, ou masque (H, W) non nul sur la zone,
+                redimensionné à l'image s'il sert de modèle pour des cartes d'une autre taille
+
+        Returns:
+            Tuple ((x0, y0, x1, y1), masque booléen du rectangle ou None si plein)
+        """
+        h, w = shape[:2]
+        region = self.region if region is None else region
+        if isinstance(region, str):
+            region = REGIONS[region]
+        if region is None:
+            return (0, 0, w, h), None
+        if isinstance(region, np.ndarray):
+            mask = region if region.shape[:2] == (h, w) else \
+                cv2.resize(region, (w, h), interpolation=cv2.INTER_NEAREST)
+            mask = (mask > 0).astype(np.uint8)
+            x, y, bw, bh = cv2.boundingRect(mask)
+            inside = mask[y:y + bh, x:x + bw].astype(bool)
+            return (x, y, x + bw, y + bh), (None if inside.all() else inside)
+        x0, y0, x1, y1 = region
+        return (int(round(x0 * w)), int(round(y0 * h)), int(round(x1 * w)), int(round(y1 * h))), None
+    
+    def apply_holographic_effect(self, image, intensity='medium', region=None):
         """
         Applique un effet holographique complet
         
         Args:
             image: Image source
             intensity: 'light', 'medium', 'heavy'
+            region: Zone des effets (voir effect_region), None = zone de l'augmenteur
         
         Returns:
             Image avec effet holographique
         """
-        if intensity == 'light':
-            rainbow_intensity = 0.15
-            glare_intensity = 0.3
-            glare_count = 1
-            pattern_intensity = 0.1
-            aberration = 2
-        elif intensity == 'heavy':
-            rainbow_intensity = 0.5
-            glare_intensity = 0.7
-            glare_count = 5
-            pattern_intensity = 0.3
-            aberration = 8
-        else:  # medium
-            rainbow_intensity = 0.3
-            glare_intensity = 0.5
-            glare_count = 3
-            pattern_intensity = 0.2
-            aberration = 5
+        if intensity not in INTENSITY_LEVELS:
+            intensity = 'medium'
         
         h, w = image.shape[:2]
+        (x0, y0, x1, y1), inside = self.effect_region(image.shape, region)
+        if (x0, y0, x1, y1) == (0, 0, w, h) and inside is None:
+            return self._apply_effect(image, intensity)
+        
+        # Effets calculés sur le rectangle seulement, puis recollés dans une copie de la carte
+        result = np.array(image)
+        if x1 <= x0 or y1 <= y0:
+            return result
+        roi = image[y0:y1, x0:x1]
+        effect = self._apply_effect(roi, intensity, cv2.BORDER_REPLICATE)
+        if inside is not None:
+            effect = np.where(inside[:, :, None], effect, roi)
+        result[y0:y1, x0:x1] = effect
+        return result
+    
+    def _apply_effect(self, image, intensity, border_mode=cv2.BORDER_CONSTANT):
+        """Calques, aberration et saturation sur toute l'image passée (carte entière ou rectangle)"""
+        aberration = INTENSITY_LEVELS[intensity][4]
+        h, w = image.shape[:2]
         
-        # 1. Arc-en-ciel
-        rainbow_angle = random.randint(0, 180)
-        rainbow = self.create_rainbow_gradient(w, h, rainbow_angle, rainbow_intensity)
-        result = cv2.addWeighted(image, 1.0, rainbow, 0.4, 0)
-        
-        # 2. Reflets
-        result = self.add_dynamic_glare(result, glare_count, glare_intensity)
-        
-        # 3. Texture
-        pattern_type = random.choice(['lines', 'dots', 'waves'])
-        result = self.add_holographic_pattern(result, pattern_type, pattern_intensity)
+        if self.bank_size > 0:
+            # 1-3. Calque pré-calculé (arc-en-ciel + reflets + texture), tourné et recadré
+            result = cv2.add(image, self.overlay_bank(w, h, intensity).sample(w, h))
+        else:
+            result = self._add_overlays(image, intensity)
         
         # 4. Aberration chromatique
         if random.random() > 0.5:
-            result = self.add_chromatic_aberration(result, aberration)
+            result = self.add_chromatic_aberration(result, aberration, border_mode)
         
         # 5. Saturation légèrement augmentée
         hsv = cv2.cvtColor(result, cv2.COLOR_BGR2HSV)
@@ -235,7 +377,55 @@ class HolographicAugmenter:
         
         return result
     
-    def augment_directory(self, input_dir, output_dir, num_variations=3):
+    def _add_overlays(self, image, intensity):
+        """Arc-en-ciel, reflets et texture générés pour cette image"""
+        rainbow_intensity, glare_intensity, glare_count, pattern_intensity, _ = INTENSITY_LEVELS[intensity]
+        h, w = image.shape[:2]
+        
+        # 1. Arc-en-ciel
+        rainbow_angle = random.randint(0, 180)
+        rainbow = self.create_rainbow_gradient(w, h, rainbow_angle, rainbow_intensity)
+        result = cv2.addWeighted(image, 1.0, rainbow, 0.4, 0)
+        
+        # 2. Reflets
+        result = self.add_dynamic_glare(result, glare_count, glare_intensity)
+        
+        # 3. Texture
+        pattern_type = random.choice(['lines', 'dots', 'waves'])
+        return self.add_holographic_pattern(result, pattern_type, pattern_intensity)
+    
+    def render_overlay(self, width, height, intensity='medium'):
+        """Calque arc-en-ciel + reflets + texture seul (sur fond noir), à ajouter à une image"""
+        return self._add_overlays(np.zeros((height, width, 3), dtype=np.uint8), intensity)
+    
+    def overlay_bank(self, width, height, intensity='medium'):
+        """Banque de calques couvrant cette taille d'image et cette intensité (créée au premier appel)"""
+        width = -(-width // OVERLAY_SIZE_STEP) * OVERLAY_SIZE_STEP
+        height = -(-height // OVERLAY_SIZE_STEP) * OVERLAY_SIZE_STEP
+        key = (width, height, intensity)
+        if key not in self._banks:
+            self._banks[key] = OverlayBank(self, width, height, intensity, self.bank_size, self.bank_seed)
+        return self._banks[key]
+    
+    def render_variations(self, img, img_path, num_variations, root_seed, encode=False):
+        """
+        Variations holographiques d'une image, chacune tirée de sa propre graine
+
+        Returns:
+            Liste de (nom de fichier, image BGR ou octets encodés si encode=True)
+        """
+        stem, suffix = os.path.splitext(os.path.basename(img_path))
+        outputs = []
+        for var in range(num_variations):
+            random.seed(holo_variation_seed(root_seed, stem, var))
+            intensity = random.choice(['light', 'medium', 'heavy'])
+            img_holo = self.apply_holographic_effect(img, intensity)
+            if encode:
+                img_holo = cv2.imencode(suffix, img_holo)[1].tobytes()
+            outputs.append((f"{stem}_holo{var+1}{suffix}", img_holo))
+        return outputs
+    
+    def augment_directory(self, input_dir, output_dir, num_variations=3, workers=1, root_seed=None):
         """
         Applique l'effet holographique à toutes les images d'un dossier
         
@@ -243,8 +433,9 @@ class HolographicAugmenter:
             input_dir: Dossier source
             output_dir: Dossier destination
             num_variations: Nombre de variations par image
+            workers: Processus de calcul des effets (1 = séquentiel, 0 = tous les coeurs)
+            root_seed: Graine racine (sortie identique quel que soit workers), None = aléatoire
         """
-        import os
         from pathlib import Path
         
         input_path = Path(input_dir)
@@ -256,25 +447,125 @@ class HolographicAugmenter:
                       list(input_path.glob("*.jpeg"))
         
         safe_print(f"🌈 Génération d'effets holographiques sur {len(image_files)} images...")
-        
-        for idx, img_path in enumerate(image_files, 1):
-            img = cv2.imread(str(img_path))
-            if img is None:
-                continue
-            
-            for var in range(num_variations):
-                intensity = random.choice(['light', 'medium', 'heavy'])
-                img_holo = self.apply_holographic_effect(img, intensity)
-                
-                # Sauvegarder
-                output_name = f"{img_path.stem}_holo{var+1}{img_path.suffix}"
-                output_file = output_path / output_name
-                cv2.imwrite(str(output_file), img_holo)
-            
-            if idx % 10 == 0:
-                safe_print(f"   Progression: {idx}/{len(image_files)}")
-        
-        safe_print(f"✅ {len(image_files) * num_variations} images holographiques générées!")
+        if root_seed is None:
+            root_seed = np.random.SeedSequence().entropy
+        safe_print(f"Graine racine : {root_seed} (--seed {root_seed} pour reproduire ce run)")
+        workers = workers if workers > 0 else multiprocessing.cpu_count()
+        
+        # Cartes décodées une seule fois (cache memory-mappé, taille native)
+        stack, card_paths, stack_file = card_stack(sorted(str(p) for p in image_files), target_size=None)
+        jobs = [(path, stack_file, row, num_variations, root_seed) for row, path in enumerate(card_paths)]
+        
+        # Écriture sur disque dans un thread : l'encodage/écriture de la carte précédente
+        # se fait pendant le calcul des effets de la suivante
+        pending = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        errors = []
+        writer = threading.Thread(target=_write_outputs, args=(pending, output_path, errors), daemon=True)
+        writer.start()
+        pool = None
+        try:
+            if workers > 1 and len(jobs) > 1:
+                safe_print(f"Génération parallèle sur {workers} processus")
+                if self.bank_size > 0:
+                    # Banques construites une fois ici, relues par mmap dans les workers
+                    shapes = {stack.shape[1:3]} if stack is not None else \
+                             {_load_job_image(job).shape[:2] for job in jobs}
+                    for shape in sorted(shapes):
+                        x0, y0, x1, y1 = self.effect_region(shape)[0]
+                        for intensity in INTENSITY_LEVELS:
+                            self.overlay_bank(x1 - x0, y1 - y0, intensity)
+                pool = multiprocessing.Pool(workers, initializer=_init_holo_worker,
+                                            initargs=(self.bank_size, self.bank_seed, self.region))
+                results = pool.imap(render_job, jobs)
+            else:
+                _init_holo_worker(self.bank_size, self.bank_seed, self.region, augmenter=self, threads=False)
+                results = map(render_job, jobs)
+            for idx, outputs in enumerate(results, 1):
+                for item in outputs:
+                    _put_output(pending, item, writer, errors)
+                if idx % 10 == 0:
+                    safe_print(f"   Progression: {idx}/{len(jobs)}")
+        except BaseException:
+            if pool is not None:
+                pool.terminate()
+            raise
+        finally:
+            if not errors:
+                _put_output(pending, None, writer, errors)
+            writer.join()
+            if pool is not None:
+                pool.close()
+                pool.join()
+        if errors:
+            raise errors[0]
+        
+        safe_print(f"✅ {len(jobs) * num_variations} images holographiques générées!")
+
+
+def holo_variation_seed(root_seed, stem, index):
+    """
+    Graine (entier pour random.seed) d'une variation holographique (image, index),
+    indépendante de l'ordre de traitement et du worker. Même entropie SeedSequence que
+    augmentation.variation_seed, mais réduite à un entier : les deux ne sont pas interchangeables.
+    """
+    return int(np.random.SeedSequence([root_seed, zlib.crc32(stem.encode("utf-8")), index]).generate_state(1)[0])
+
+
+# Augmenteur des workers, créé une fois par processus
+_WORKER = {}
+
+def _init_holo_worker(bank_size, bank_seed, region=None, augmenter=None, threads=True):
+    if threads:
+        # Un seul thread OpenCV par worker pour éviter la sur-souscription des coeurs
+        cv2.setNumThreads(1)
+    _WORKER["augmenter"] = augmenter or HolographicAugmenter(bank_size=bank_size, bank_seed=bank_seed,
+                                                             region=region)
+    # En séquentiel, l'encodage est laissé au thread d'écriture ; les workers encodent eux-mêmes
+    _WORKER["encode"] = threads
+
+def _load_job_image(job):
+    path, stack_file, row = job[:3]
+    if stack_file is not None:
+        return load_stack_row(stack_file, row)
+    return decode_card(path, None)
+
+def render_job(job):
+    """Variations d'une carte : job = (chemin, pile .npy ou None, ligne, variations, graine racine)"""
+    path, _, _, num_variations, root_seed = job
+    img = _load_job_image(job)
+    if img is None:
+        return []
+    return _WORKER["augmenter"].render_variations(img, path, num_variations, root_seed, encode=_WORKER["encode"])
+
+def _write_outputs(pending, output_path, errors):
+    # Thread d'écriture : octets déjà encodés (workers) ou image à encoder.
+    # Une erreur arrête le thread et est gardée dans errors pour le thread principal
+    try:
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            name, data = item
+            if isinstance(data, bytes):
+                (output_path / name).write_bytes(data)
+            elif not cv2.imwrite(str(output_path / name), data):
+                raise OSError(f"Écriture impossible : {output_path / name}")
+    except Exception as e:
+        errors.append(e)
+
+def _put_output(pending, item, writer, errors):
+    # Ajout à la file sans blocage indéfini : la file pleine ne se vide plus si le
+    # thread d'écriture s'est arrêté sur une erreur
+    while True:
+        if errors:
+            raise errors[0]
+        if not writer.is_alive():
+            raise RuntimeError("Thread d'écriture arrêté")
+        try:
+            pending.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            pass
 
 
 def main():
@@ -286,9 +577,26 @@ def main():
     parser.add_argument("output", help="Dossier de sortie")
     parser.add_argument("--variations", type=int, default=3, 
                         help="Nombre de variations par image")
+    parser.add_argument("--bank", type=int, default=OVERLAY_BANK_SIZE,
+                        help="Calques pré-calculés par taille et intensité, tournés et recadrés "
+                             f"pour chaque image (défaut: {OVERLAY_BANK_SIZE}, 0 = calques générés par image)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processus de calcul des effets (1 = séquentiel, 0 = tous les coeurs)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Graine racine (sortie identique quel que soit --workers)")
+    parser.add_argument("--region", choices=sorted(REGIONS), default='full',
+                        help="Zone des effets : toute la carte ou seulement l'illustration (artwork)")
+    parser.add_argument("--mask", default=None,
+                        help="Image modèle de la zone des effets (pixels non noirs), "
+                             "redimensionnée à chaque carte ; prioritaire sur --region")
     args = parser.parse_args()
     
-    augmenter = HolographicAugmenter()
+    region = args.region
+    if args.mask:
+        region = cv2.imread(args.mask, cv2.IMREAD_GRAYSCALE)
+        if region is None:
+            parser.error(f"Masque illisible : {args.mask}")
+    augmenter = HolographicAugmenter(bank_size=args.bank, region=region)
     
     from pathlib import Path
     input_path = Path(args.input)
@@ -301,8 +609,10 @@ def main():
         safe_print(f"✅ Image holographique générée: {args.output}")
     else:
         # Traiter un dossier
-        augmenter.augment_directory(args.input, args.output, args.variations)
+        augmenter.augment_directory(args.input, args.output, args.variations, args.workers, args.seed)
 
 
 if __name__ == "__main__":
+    # Nécessaire pour multiprocessing dans l'exécutable PyInstaller (Windows)
+    multiprocessing.freeze_support()
     main()
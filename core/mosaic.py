@@ -2,20 +2,34 @@
 import os
 import sys
 import cv2
-import pandas as pd
 import numpy as np
 from glob import glob
 import re
 import random
 import math
-import time
-import requests
+import hashlib
+import json
+import argparse
+import multiprocessing
+from functools import lru_cache
 
 # Import safe_print pour gérer l'encodage Unicode sur Windows
 try:
-    from .utils import safe_print
+    from .utils import safe_print, ProgressReporter
+    from .card_cache import card_stack, save_stack, open_stack, prune_stacks, CACHE_DIR
+    from .geometry import (project_corners, affine_corners, polygons_to_yolo, format_yolo_labels,
+                           polygons_to_yolo_seg, polygons_to_yolo_obb, OccupancyGrid)
+    from .backgrounds import BackgroundIndex, BackgroundProvider, WEB_DIR, DEFAULT_MEMORY_BUDGET_MB
+    from .shards import ShardWriter, SHARD_DIR, DEFAULT_SHARD_MB, remove_shards
+    from .class_registry import load_class_registry
 except ImportError:
-    from utils import safe_print
+    from utils import safe_print, ProgressReporter
+    from card_cache import card_stack, save_stack, open_stack, prune_stacks, CACHE_DIR
+    from geometry import (project_corners, affine_corners, polygons_to_yolo, format_yolo_labels,
+                          polygons_to_yolo_seg, polygons_to_yolo_obb, OccupancyGrid)
+    from backgrounds import BackgroundIndex, BackgroundProvider, WEB_DIR, DEFAULT_MEMORY_BUDGET_MB
+    from shards import ShardWriter, SHARD_DIR, DEFAULT_SHARD_MB, remove_shards
+    from class_registry import load_class_registry
 
 # ----- Paramètres globaux pour la transformation 3D -----
 THETA_MIN = -30    # Pour transform_mode==1 en mode 1 ou 3
@@ -32,31 +46,49 @@ PHI_MAX_MODE2   = 30
 # Nombre de layouts à générer par combinaison en mode ALL
 NUM_VARIATIONS_ALL = 50
 
+# Layout mode 4 (placement dense) : cartes par layout, recouvrement maximal à la pose,
+# fraction visible minimale pour garder le label, essais de position par carte
+PACK_CARDS = 12
+MAX_OVERLAP = 0.3
+MIN_VISIBLE = 0.6
+PACK_ATTEMPTS = 25
+
+# Canevas de référence : les cartes (280x380), marges et fonds sont dimensionnés pour
+# cette taille et mis à l'échelle pour les autres (--canvas)
+CANVAS_SIZE = (1920, 1080)
+
+# Pool de fonds mosaïque (background_mode 0) pré-rendus une fois par run
+BACKGROUND_POOL_SIZE = 16
+# Marge autour des fonds du pool : le recadrage aléatoire décale la mosaïque d'un layout à l'autre
+BACKGROUND_POOL_MARGIN = 64
+# Pools conservés d'un run à l'autre (--seed) : dossier et ménage propres, séparés du cache des cartes
+BACKGROUND_CACHE_DIR = os.path.join(".cache", "backgrounds")
+MAX_BACKGROUND_POOLS = 4
+MAX_BACKGROUND_CACHE_MB = 1024
+BACKGROUND_POOL_PATTERN = re.compile(r"backgrounds_[0-9a-f]{40}\.npy")
+
 # Répertoires d'entrée et de sortie
 INPUT_DIRS = [os.path.join("output", "augmented", "images")]
 FAKE_DIR = "fakeimg_augmented"  # Utilise les fausses cartes augmentées
 MOSAIC_DIR = "mosaic"  # pour background_mode==1
+# Formats acceptés en entrée (augmentation.py --format png/jpg/webp)
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".webp"]
 
 # ----- Nouveaux dossiers pour YOLOv8 -----
 YOLO_OUTPUT_DIR = os.path.join("output", "yolov8")
 YOLO_IMAGES_DIR = os.path.join(YOLO_OUTPUT_DIR, "images")
 YOLO_LABELS_DIR = os.path.join(YOLO_OUTPUT_DIR, "labels")
+# Labels supplémentaires (--seg / --obb), écrits dans le même passage que les boîtes
+LABEL_FORMATS = ("seg", "obb")
+YOLO_EXTRA_LABELS_DIRS = {fmt: os.path.join(YOLO_OUTPUT_DIR, f"labels_{fmt}") for fmt in LABEL_FORMATS}
 os.makedirs(YOLO_IMAGES_DIR, exist_ok=True)
 os.makedirs(YOLO_LABELS_DIR, exist_ok=True)
 
 # ----- Fonctions de chargement et de traitement des images -----
 def load_card_data(excel_path):
-    df = pd.read_excel(excel_path, usecols=["Set #", "Name"])
-    card_dict = {}
-    class_map = {}
-    for _, row in df.iterrows():
-        number = row["Set #"].split('/')[0].zfill(3)
-        name = row["Name"].replace(" ", "_")
-        if number not in card_dict:
-            card_dict[number] = name
-            # L'ID YOLO = le numéro de la carte (001 → ID 1, 050 → ID 50, etc.)
-            class_map[number] = int(number)
-    return card_dict, class_map
+    # Registre partagé (cache JSON) : l'ID YOLO = le numéro de la carte (001 → ID 1, 050 → ID 50, etc.)
+    registry = load_class_registry(excel_path)
+    return registry.card_dict, registry.class_map
 
 def extract_card_number(filename):
     """
@@ -82,27 +114,28 @@ def extract_card_number(filename):
     
     return None
 
-def resize_cards(image_paths, target_size=(280,380)):
-    resized_images = []
-    for img_path in image_paths:
-        img = cv2.imread(img_path, cv2.IMREAD_UNCHANGED)
-        if img is None:
-            continue
-        
-        # Convertir RGBA en RGB si nécessaire
-        if len(img.shape) == 3 and img.shape[2] == 4:
-            # Image a un canal alpha, le convertir en BGR
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-        
-        img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
-        resized_images.append((img, img_path))
-    return resized_images
-
-# ----- Transformation 2D classique -----
-def rotate_image(image, angle):
-    if image.shape[2] == 3:
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
-    h, w = image.shape[:2]
+# ----- Cache des transformations -----
+# Les angles 2D sont des entiers tirés dans de petites plages : matrice, taille de sortie
+# et masque alpha déformé sont mémorisés par (taille de carte, angle) au lieu d'être
+# recalculés à chaque placement. Les angles 3D sont continus (presque jamais répétés) :
+# la projection est recalculée à chaque fois. Les cartes sont déformées en BGR.
+TRANSFORM_CACHE_SIZE = 256  # ~0.2 Mo par entrée (masque alpha uint8), par processus
+
+def _warped_alpha(warp, w, h, matrix, size):
+    # Masque alpha d'une carte opaque déformée (bords anti-aliasés comme le canal alpha BGRA)
+    alpha = warp(np.full((h, w), 255, dtype=np.uint8), matrix, size, flags=cv2.INTER_LINEAR,
+                 borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    alpha.flags.writeable = False
+    return alpha
+
+@lru_cache(maxsize=TRANSFORM_CACHE_SIZE)
+def rotation_transform(w, h, angle):
+    """
+    Rotation 2D d'une carte w x h, agrandie pour ne rien rogner (mémorisée)
+
+    Returns:
+        (matrice 2x3, taille de sortie (largeur, hauteur), masque alpha uint8), en lecture seule
+    """
     center = (w // 2, h // 2)
     rot_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
     cos = np.abs(rot_matrix[0,0])
@@ -111,55 +144,17 @@ def rotate_image(image, angle):
     new_h = int((h*cos)+(w*sin))
     rot_matrix[0,2] += (new_w/2) - center[0]
     rot_matrix[1,2] += (new_h/2) - center[1]
-    rotated = cv2.warpAffine(image, rot_matrix, (new_w,new_h), flags=cv2.INTER_LINEAR,
-                             borderMode=cv2.BORDER_CONSTANT, borderValue=(0,0,0,0))
-    return rotated, rot_matrix
+    rot_matrix.flags.writeable = False
+    return rot_matrix, (new_w, new_h), _warped_alpha(cv2.warpAffine, w, h, rot_matrix, (new_w, new_h))
 
-# ----- Transformation 3D par projection perspective -----
-def rotate_image_3d(image, theta=None, phi=None):
+def perspective_transform(w, h, theta, phi):
     """
-    Applique une rotation 3D à l'image par projection perspective, en conservant ses proportions.
-    Si theta et phi ne sont pas fournis, ils sont choisis aléatoirement dans les plages par défaut.
-    Pour layout_mode 2 (avec transform_mode==1), des plages élargies peuvent être utilisées via l'appel explicite.
-    
-    Renvoie :
-      - warped : l'image transformée (en BGRA),
-      - H : la matrice d'homographie,
-      - projected_adjusted : les points projetés ajustés (pour annotation).
+    Projection perspective d'une carte w x h inclinée de theta/phi degrés
+
+    Returns:
+        (homographie 3x3, taille de sortie, coins projetés ajustés, masque alpha uint8)
     """
-    if image.shape[2] == 3:
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
-    h, w = image.shape[:2]
-    
-    if theta is None:
-        theta = random.uniform(THETA_MIN, THETA_MAX)
-    if phi is None:
-        phi = random.uniform(PHI_MIN, PHI_MAX)
-    
-    theta_rad = np.deg2rad(theta)
-    phi_rad = np.deg2rad(phi)
-    
-    R_x = np.array([[1, 0, 0],
-                    [0, np.cos(phi_rad), -np.sin(phi_rad)],
-                    [0, np.sin(phi_rad), np.cos(phi_rad)]])
-    R_y = np.array([[np.cos(theta_rad), 0, np.sin(theta_rad)],
-                    [0, 1, 0],
-                    [-np.sin(theta_rad), 0, np.cos(theta_rad)]])
-    R = R_y @ R_x
-
-    corners_3d = np.array([[0,0,0],
-                           [w,0,0],
-                           [w,h,0],
-                           [0,h,0]], dtype=np.float32)
-    rotated_corners = np.dot(corners_3d, R.T)
-    
-    f = 1.0 * max(w, h)
-    projected = []
-    for point in rotated_corners:
-        X, Y, Z = point
-        factor = f / (Z + f)
-        projected.append([X * factor, Y * factor])
-    projected = np.array(projected, dtype=np.float32)
+    projected = project_corners(w, h, theta, phi)
     
     x_min = np.min(projected[:,0])
     y_min = np.min(projected[:,1])
@@ -171,13 +166,45 @@ def rotate_image_3d(image, theta=None, phi=None):
     projected_adjusted = projected - np.array([x_min, y_min], dtype=np.float32)
     src = np.array([[0,0],[w,0],[w,h],[0,h]], dtype=np.float32)
     H = cv2.getPerspectiveTransform(src, projected_adjusted)
-    warped = cv2.warpPerspective(image, H, (output_w, output_h), flags=cv2.INTER_LINEAR,
-                                 borderMode=cv2.BORDER_CONSTANT, borderValue=(0,0,0,0))
-    
-    return warped, H, projected_adjusted
+    alpha = _warped_alpha(cv2.warpPerspective, w, h, H, (output_w, output_h))
+    return H, (output_w, output_h), projected_adjusted, alpha
+
+def warp_card(card, angle):
+    """
+    Rotation 2D d'une carte BGR
+
+    Returns:
+        (carte déformée BGR, masque alpha, matrice 2x3)
+    """
+    h, w = card.shape[:2]
+    rot_matrix, size, alpha = rotation_transform(w, h, angle)
+    warped = cv2.warpAffine(card, rot_matrix, size, flags=cv2.INTER_LINEAR,
+                            borderMode=cv2.BORDER_CONSTANT, borderValue=(0,0,0))
+    return warped, alpha, rot_matrix
+
+def warp_card_3d(card, theta=None, phi=None):
+    """
+    Projection perspective 3D d'une carte BGR. Si theta et phi ne sont pas fournis, ils
+    sont choisis aléatoirement dans les plages par défaut.
+
+    Returns:
+        (carte déformée BGR, masque alpha, homographie, coins projetés ajustés)
+    """
+    if theta is None:
+        theta = random.uniform(THETA_MIN, THETA_MAX)
+    if phi is None:
+        phi = random.uniform(PHI_MIN, PHI_MAX)
+    h, w = card.shape[:2]
+    H, size, projected_adjusted, alpha = perspective_transform(w, h, theta, phi)
+    warped = cv2.warpPerspective(card, H, size, flags=cv2.INTER_LINEAR,
+                                 borderMode=cv2.BORDER_CONSTANT, borderValue=(0,0,0))
+    return warped, alpha, H, projected_adjusted
 
 # ----- Superposition sur le canevas -----
-def overlay_on_canvas(canvas, overlay, x, y):
+def overlay_on_canvas(canvas, overlay, x, y, alpha=None):
+    """
+    Superpose overlay (BGRA, ou BGR + masque alpha uint8 séparé) sur le canevas en (x, y)
+    """
     h, w = overlay.shape[:2]
     canvas_h, canvas_w = canvas.shape[:2]
     x_start = max(x, 0)
@@ -190,13 +217,16 @@ def overlay_on_canvas(canvas, overlay, x, y):
     overlay_y_start = y_start - y
     overlay_x_end = overlay_x_start + (x_end - x_start)
     overlay_y_end = overlay_y_start + (y_end - y_start)
-    roi = canvas[y_start:y_end, x_start:x_end].astype(float)
-    if overlay.shape[2] == 4:
-        overlay_rgb = overlay[overlay_y_start:overlay_y_end, overlay_x_start:overlay_x_end, :3].astype(float)
-        alpha = overlay[overlay_y_start:overlay_y_end, overlay_x_start:overlay_x_end, 3].astype(float) / 255.0
-        alpha = np.stack([alpha, alpha, alpha], axis=2)
-        blended = overlay_rgb * alpha + roi * (1 - alpha)
-        canvas[y_start:y_end, x_start:x_end] = blended.astype(np.uint8)
+    if alpha is not None or overlay.shape[2] == 4:
+        roi = canvas[y_start:y_end, x_start:x_end]
+        overlay_rgb = overlay[overlay_y_start:overlay_y_end, overlay_x_start:overlay_x_end, :3]
+        if alpha is None:
+            alpha = overlay[:, :, 3]
+        # Mélange alpha en un seul passage OpenCV (poids float32 mono-canal, sortie uint8
+        # arrondie) : écart d'au plus 1 niveau avec l'ancien calcul float64, ~6x plus rapide
+        alpha = alpha[overlay_y_start:overlay_y_end, overlay_x_start:overlay_x_end].astype(np.float32)
+        alpha *= 1.0 / 255.0
+        canvas[y_start:y_end, x_start:x_end] = cv2.blendLinear(overlay_rgb, roi, alpha, 1.0 - alpha)
     else:
         canvas[y_start:y_end, x_start:x_end] = overlay[overlay_y_start:overlay_y_end, overlay_x_start:overlay_x_end]
     return canvas
@@ -204,7 +234,8 @@ def overlay_on_canvas(canvas, overlay, x, y):
 # ----- Création de la mosaïque de fond -----
 def create_mosaic_background(canvas, fake_images):
     canvas_h, canvas_w = canvas.shape[:2]
-    fake_w, fake_h = 280, 380
+    # Pas de la mosaïque déduit de la taille des fausses cartes (280x380 sur le canevas de référence)
+    fake_h, fake_w = fake_images[0][0].shape[:2]
     step_x = int(fake_w * 0.5)
     step_y = int(fake_h * 0.5)
     for x in range(-fake_w//2, canvas_w+fake_w//2, step_x):
@@ -216,59 +247,142 @@ def create_mosaic_background(canvas, fake_images):
             # Utiliser les fake_images déjà chargées au lieu de recharger à chaque fois
             fake_card, _ = random.choice(fake_images)
             angle = random.randint(10,20) * random.choice([-1, 1])
-            rotated_fake, _ = rotate_image(fake_card, angle)
-            canvas = overlay_on_canvas(canvas, rotated_fake, pos_x, pos_y)
+            rotated_fake, fake_alpha, _ = warp_card(fake_card, angle)
+            canvas = overlay_on_canvas(canvas, rotated_fake, pos_x, pos_y, fake_alpha)
     return canvas
 
+# ----- Pool de fonds mosaïque pré-rendus -----
+def background_seed(root_seed, index):
+    """Graine d'un fond du pool (distincte des graines de layouts)"""
+    return int(np.random.SeedSequence([root_seed, 0, index]).generate_state(1)[0])
+
+def render_background(job):
+    """
+    Rend un fond mosaïque du pool, agrandi de BACKGROUND_POOL_MARGIN de chaque côté
+
+    Args:
+        job: (index, seed, canvas_width, canvas_height)
+    """
+    index, seed, canvas_width, canvas_height = job
+    _check_worker_state()
+    random.seed(seed)
+    margin = BACKGROUND_POOL_MARGIN
+    canvas = np.ones((canvas_height + 2*margin, canvas_width + 2*margin, 3), dtype=np.uint8) * 255
+    return create_mosaic_background(canvas, _LAYOUT_STATE["fake_images"])
+
+def sample_background(background_pool, canvas_width, canvas_height):
+    """Tire un fond du pool avec recadrage et miroir aléatoires (copie modifiable)"""
+    bg = background_pool[random.randrange(len(background_pool))]
+    offset_x = random.randint(0, bg.shape[1] - canvas_width)
+    offset_y = random.randint(0, bg.shape[0] - canvas_height)
+    crop = bg[offset_y:offset_y+canvas_height, offset_x:offset_x+canvas_width]
+    flip_code = random.choice([None, 0, 1, -1])
+    if flip_code is None:
+        return np.array(crop)
+    return cv2.flip(np.ascontiguousarray(crop), flip_code)
+
+def background_pool_file(fake_stack_file, pool_size, root_seed, canvas_width=CANVAS_SIZE[0],
+                         canvas_height=CANVAS_SIZE[1]):
+    """Fichier cache du pool : dépend des fausses cartes, de la taille du pool et de la graine"""
+    key = f"{os.path.basename(fake_stack_file)}|{pool_size}|{root_seed}|{canvas_width}x{canvas_height}|{BACKGROUND_POOL_MARGIN}"
+    return os.path.join(BACKGROUND_CACHE_DIR, "backgrounds_" + hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy")
+
 # ----- Choix du fond -----
-def get_background(canvas_width, canvas_height, background_mode, fake_images, mosaic_dir="mosaic"):
+def get_background(canvas_width, canvas_height, background_mode, fake_images, mosaic_dir="mosaic",
+                   background_pool=None, web_backgrounds=None, local_backgrounds=None):
     if background_mode == 0:
+        if background_pool is not None and len(background_pool):
+            return sample_background(background_pool, canvas_width, canvas_height)
         canvas = np.ones((canvas_height, canvas_width, 3), dtype=np.uint8) * 255
         canvas = create_mosaic_background(canvas, fake_images)
         return canvas
     elif background_mode == 1:
-        image_paths = glob(os.path.join(mosaic_dir, "*.*"))
-        if not image_paths:
-            return np.ones((canvas_height, canvas_width, 3), dtype=np.uint8) * 255
-        chosen = random.choice(image_paths)
-        bg = cv2.imread(chosen, cv2.IMREAD_COLOR)
+        # Dossier indexé une fois par run ; sans fournisseur partagé, index ponctuel
+        if local_backgrounds is None:
+            local_backgrounds = BackgroundProvider(mosaic_dir, (canvas_width, canvas_height))
+        bg = local_backgrounds.sample()
         if bg is None:
             return np.ones((canvas_height, canvas_width, 3), dtype=np.uint8) * 255
-        bg = cv2.resize(bg, (canvas_width, canvas_height), interpolation=cv2.INTER_AREA)
         return bg
     elif background_mode == 2:
-        try:
-            url = "https://picsum.photos/1920/1080"
-            resp = requests.get(url, timeout=10)
-            if resp.status_code == 200:
-                web_dir = "web"
-                if not os.path.exists(web_dir):
-                    os.makedirs(web_dir)
-                filename = os.path.join(web_dir, "background_" + str(int(time.time())) + ".jpg")
-                with open(filename, "wb") as f:
-                    f.write(resp.content)
-                bg = cv2.imread(filename, cv2.IMREAD_COLOR)
-                if bg is not None:
-                    bg = cv2.resize(bg, (canvas_width, canvas_height), interpolation=cv2.INTER_AREA)
-                    return bg
-        except Exception as e:
-            safe_print("Erreur lors du téléchargement du fond:", e)
+        # Corpus local pré-indexé (core/backgrounds.py prefetch) : aucun accès réseau ici
+        if web_backgrounds is not None:
+            bg = web_backgrounds.sample()
+            if bg is not None:
+                return bg
         return np.ones((canvas_height, canvas_width, 3), dtype=np.uint8) * 255
     else:
         return np.ones((canvas_height, canvas_width, 3), dtype=np.uint8) * 255
 
+# ----- Taille du canevas -----
+def parse_canvas_size(value):
+    """
+    Taille du canevas depuis la ligne de commande : "LxH" ou un seul côté (largeur,
+    hauteur déduite au ratio 16:9 du canevas de référence, ex. 640 -> 640x360)
+    """
+    try:
+        if "x" in value.lower():
+            width, height = (int(v) for v in value.lower().split("x"))
+        else:
+            width = int(value)
+            height = int(round(width * CANVAS_SIZE[1] / CANVAS_SIZE[0]))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"taille de canevas invalide : {value!r} (ex. 640 ou 1024x576)")
+    if width < 64 or height < 64:
+        raise argparse.ArgumentTypeError(f"canevas trop petit : {width}x{height}")
+    return width, height
+
+def canvas_scale(canvas_size):
+    """Facteur d'échelle des cartes par rapport au canevas de référence"""
+    return min(canvas_size[0] / CANVAS_SIZE[0], canvas_size[1] / CANVAS_SIZE[1])
+
+def scale_cards(cards, scale):
+    """Redimensionne des cartes (image, chemin) d'un facteur scale (INTER_AREA)"""
+    scaled = []
+    for img, path in cards:
+        h, w = img.shape[:2]
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        scaled.append((cv2.resize(img, size, interpolation=cv2.INTER_AREA), path))
+    return scaled
+
 # ----- Création d'un layout -----
 def create_layout_group(images, group_index, card_dict, class_map, merged_mapping, fake_images,
-                        layout_mode=1, background_mode=0, transform_mode=0, columns=4, rows=2, margin=20):
-    canvas_width = 1920
-    canvas_height = 1080
+                        layout_mode=1, background_mode=0, transform_mode=0, columns=4, rows=2, margin=20,
+                        background_pool=None, canvas_size=CANVAS_SIZE, web_backgrounds=None,
+                        local_backgrounds=None, max_overlap=MAX_OVERLAP, min_visible=MIN_VISIBLE,
+                        verbose=True, details=None, save=True, extra_labels=None):
+    """
+    Compose un layout, l'écrit dans les dossiers YOLOv8 et renvoie (image, lignes de labels)
+    (save=False : rien n'est écrit, l'appelant se charge de la sortie, ex. shards tar)
+
+    verbose=False supprime les lignes par annotation ; si details est une liste, chaque
+    carte annotée y est ajoutée (classe, polygone, boîte, fraction visible) pour le
+    fichier JSONL d'annotations. Si extra_labels est un dict dont les clés sont des
+    formats de LABEL_FORMATS ("seg", "obb"), les lignes de labels correspondantes y
+    sont rangées (et écrites dans labels_seg/, labels_obb/).
+    """
+    canvas_width, canvas_height = canvas_size
+    # Rendu direct à la résolution cible : cartes et marges suivent l'échelle du canevas
+    scale = canvas_scale(canvas_size)
+    if scale != 1.0:
+        images = scale_cards(images, scale)
+        margin = max(1, int(round(margin * scale)))
     canvas_size = (canvas_height, canvas_width, 3)
-    layout = get_background(canvas_width, canvas_height, background_mode, fake_images)
+    layout = get_background(canvas_width, canvas_height, background_mode, fake_images,
+                            background_pool=background_pool, web_backgrounds=web_backgrounds,
+                            local_backgrounds=local_backgrounds)
     # Ancien code pour masque polygonal (non utilisé pour YOLOv8)
     # mask_image = np.zeros(canvas_size, dtype=np.uint8)
     
-    annotations = []  # Pour stocker les annotations YOLO
     used_classes = {}  # (optionnel, si vous souhaitez garder trace des classes utilisées)
+    # Géométrie des cartes annotées, convertie en labels YOLO en un seul passage après le placement
+    label_classes = []
+    label_offsets = []
+    label_sizes = []
+    label_shapes = []  # coins projetés (3D) ou matrices de rotation (2D)
+    label_cards = []  # indice de la carte dans la carte d'occupation (layout_mode 4)
+    # Layout mode 4 : carte d'occupation pour limiter les recouvrements et mesurer les parties visibles
+    grid = OccupancyGrid(canvas_width, canvas_height) if layout_mode == 4 else None
 
     if layout_mode in [1,2]:
         cell_width = (canvas_width - (columns+1)*margin) // columns
@@ -283,33 +397,53 @@ def create_layout_group(images, group_index, card_dict, class_map, merged_mappin
             if layout_mode == 1:
                 angle = random.randint(10,20) * random.choice([-1,1])
                 if transform_mode == 0:
-                    rotated_card, rot_matrix = rotate_image(card, angle)
+                    rotated_card, card_alpha, rot_matrix = warp_card(card, angle)
                     r_h, r_w = rotated_card.shape[:2]
                 else:
-                    rotated_card, H, poly = rotate_image_3d(card)
+                    rotated_card, card_alpha, H, poly = warp_card_3d(card)
                     r_h, r_w = rotated_card.shape[:2]
             elif layout_mode == 2:
                 if random.random() < 0.5:
                     card = cv2.flip(card, 1)
                 if transform_mode == 0:
                     angle = random.randint(-180,180)
-                    rotated_card, rot_matrix = rotate_image(card, angle)
+                    rotated_card, card_alpha, rot_matrix = warp_card(card, angle)
                     r_h, r_w = rotated_card.shape[:2]
                 else:
                     theta_val = random.uniform(THETA_MIN_MODE2, THETA_MAX_MODE2)
                     phi_val = random.uniform(PHI_MIN_MODE2, PHI_MAX_MODE2)
-                    rotated_card, H, poly = rotate_image_3d(card, theta=theta_val, phi=phi_val)
+                    rotated_card, card_alpha, H, poly = warp_card_3d(card, theta=theta_val, phi=phi_val)
                     r_h, r_w = rotated_card.shape[:2]
         elif layout_mode == 3:
             if transform_mode == 0:
                 angle = random.randint(10,20)*random.choice([-1,1])
-                rotated_card, rot_matrix = rotate_image(card, angle)
+                rotated_card, card_alpha, rot_matrix = warp_card(card, angle)
                 r_h, r_w = rotated_card.shape[:2]
             else:
-                rotated_card, H, poly = rotate_image_3d(card)
+                rotated_card, card_alpha, H, poly = warp_card_3d(card)
                 r_h, r_w = rotated_card.shape[:2]
             cell_x = random.randint(0, canvas_width - r_w)
             cell_y = random.randint(0, canvas_height - r_h)
+        elif layout_mode == 4:
+            if transform_mode == 0:
+                angle = random.randint(-30, 30)
+                rotated_card, card_alpha, rot_matrix = warp_card(card, angle)
+            else:
+                rotated_card, card_alpha, H, poly = warp_card_3d(card)
+            r_h, r_w = rotated_card.shape[:2]
+            # Premier emplacement aléatoire (PACK_ATTEMPTS essais) qui respecte le recouvrement
+            # maximal ; si aucun ne convient, la carte n'est pas posée
+            position = None
+            for _ in range(PACK_ATTEMPTS):
+                x = random.randint(0, max(0, canvas_width - r_w))
+                y = random.randint(0, max(0, canvas_height - r_h))
+                if grid.overlap(card_alpha, x, y) <= max_overlap:
+                    position = (x, y)
+                    break
+            if position is None:
+                # Plus de place sur le canevas
+                continue
+            cell_x, cell_y = position
         else:
             col = i % columns
             row = i // columns
@@ -317,10 +451,10 @@ def create_layout_group(images, group_index, card_dict, class_map, merged_mappin
             cell_y = margin + row * (cell_height + margin)
             angle = random.randint(10,20)*random.choice([-1,1])
             if transform_mode == 0:
-                rotated_card, rot_matrix = rotate_image(card, angle)
+                rotated_card, card_alpha, rot_matrix = warp_card(card, angle)
                 r_h, r_w = rotated_card.shape[:2]
             else:
-                rotated_card, H, poly = rotate_image_3d(card)
+                rotated_card, card_alpha, H, poly = warp_card_3d(card)
                 r_h, r_w = rotated_card.shape[:2]
         
         if layout_mode in [1,2]:
@@ -332,7 +466,8 @@ def create_layout_group(images, group_index, card_dict, class_map, merged_mappin
             pos_x = cell_x
             pos_y = cell_y
 
-        layout = overlay_on_canvas(layout, rotated_card, pos_x, pos_y)
+        layout = overlay_on_canvas(layout, rotated_card, pos_x, pos_y, card_alpha)
+        grid_index = grid.place(card_alpha, pos_x, pos_y) if grid is not None else None
 
         filename = os.path.basename(path)
         card_number = extract_card_number(filename)
@@ -342,27 +477,57 @@ def create_layout_group(images, group_index, card_dict, class_map, merged_mappin
             new_class_id = merged_mapping[card_number]  # déjà en 0-index
             used_classes[new_class_id] = class_name  # (optionnel)
             orig_h, orig_w = card.shape[:2]
-            corners = np.array([[0,0],[orig_w,0],[orig_w,orig_h],[0,orig_h]], dtype=np.float32)
-            if transform_mode == 1:
-                polygon = [(int(px+pos_x), int(py+pos_y)) for px,py in poly]
-            else:
-                transformed_corners = cv2.transform(np.array([corners]), rot_matrix)[0] + [pos_x, pos_y]
-                polygon = [(int(px), int(py)) for px,py in transformed_corners]
-            safe_print(f"Groupe {group_index}, Annotation classe {new_class_id}: {polygon}")
-
-            # Calcul de la bounding box à partir du polygone
-            xs = [pt[0] for pt in polygon]
-            ys = [pt[1] for pt in polygon]
-            min_x = min(xs)
-            max_x = max(xs)
-            min_y = min(ys)
-            max_y = max(ys)
-            bbox_cx = (min_x + max_x) / 2 / canvas_width
-            bbox_cy = (min_y + max_y) / 2 / canvas_height
-            bbox_w = (max_x - min_x) / canvas_width
-            bbox_h = (max_y - min_y) / canvas_height
-            annotation_line = f"{new_class_id} {bbox_cx:.6f} {bbox_cy:.6f} {bbox_w:.6f} {bbox_h:.6f}"
-            annotations.append(annotation_line)
+            label_classes.append(new_class_id)
+            label_offsets.append((pos_x, pos_y))
+            label_sizes.append((orig_w, orig_h))
+            label_shapes.append(poly if transform_mode == 1 else rot_matrix)
+            label_cards.append(grid_index)
+
+    label_visible = [None] * len(label_classes)
+    if grid is not None and label_classes:
+        # Labels des cartes trop masquées par les suivantes écartés
+        visible = grid.visible_fractions()[label_cards]
+        for class_id, fraction in zip(label_classes, visible):
+            if fraction < min_visible:
+                if verbose:
+                    safe_print(f"Groupe {group_index}, classe {class_id} visible à {fraction:.0%} : label ignoré")
+                if details is not None:
+                    details.append({"class_id": int(class_id), "visible": round(float(fraction), 4), "dropped": True})
+        kept = [k for k, fraction in enumerate(visible) if fraction >= min_visible]
+        label_visible = [float(visible[k]) for k in kept]
+        label_classes = [label_classes[k] for k in kept]
+        label_offsets = [label_offsets[k] for k in kept]
+        label_sizes = [label_sizes[k] for k in kept]
+        label_shapes = [label_shapes[k] for k in kept]
+
+    annotations = []  # Pour stocker les annotations YOLO
+    if label_classes:
+        # Polygones de toutes les cartes dans le repère du canevas : (N, 4, 2)
+        if transform_mode == 1:
+            polygons = np.stack(label_shapes).astype(np.float64)
+        else:
+            polygons = affine_corners(label_sizes, np.stack(label_shapes))
+        polygons = polygons + np.array(label_offsets, dtype=np.float64)[:, None, :]
+        if verbose:
+            for class_id, polygon in zip(label_classes, polygons.astype(np.int64)):
+                safe_print(f"Groupe {group_index}, Annotation classe {class_id}: {[tuple(pt) for pt in polygon.tolist()]}")
+        # Boîtes englobantes rognées au canevas (cartes partiellement hors champ)
+        labels, kept = polygons_to_yolo(label_classes, polygons, canvas_width, canvas_height)
+        annotations = format_yolo_labels(labels)
+        if details is not None:
+            for polygon, fraction, label in zip(polygons.astype(np.int64)[kept],
+                                                np.array(label_visible, dtype=object)[kept], labels):
+                details.append({"class_id": int(label[0]), "polygon": polygon.tolist(),
+                                "bbox": [round(float(v), 6) for v in label[1:]],
+                                "visible": None if fraction is None else round(fraction, 4)})
+        # Polygones exacts (segmentation) et boîtes orientées, à partir des mêmes coins
+        if extra_labels is not None and "seg" in extra_labels:
+            extra_labels["seg"], _ = polygons_to_yolo_seg(label_classes, polygons, canvas_width, canvas_height)
+        if extra_labels is not None and "obb" in extra_labels:
+            extra_labels["obb"], _ = polygons_to_yolo_obb(label_classes, polygons, canvas_width, canvas_height)
+
+    if not save:
+        return layout, annotations
 
     # Enregistrement du layout et des annotations dans les dossiers YOLOv8
     layout_filename = f"layout_{group_index:03d}.png"
@@ -373,30 +538,275 @@ def create_layout_group(images, group_index, card_dict, class_map, merged_mappin
     label_path = os.path.join(YOLO_LABELS_DIR, label_filename)
     with open(label_path, "w") as f:
         f.write("\n".join(annotations))
+    for fmt, lines in (extra_labels or {}).items():
+        os.makedirs(YOLO_EXTRA_LABELS_DIRS[fmt], exist_ok=True)
+        with open(os.path.join(YOLO_EXTRA_LABELS_DIRS[fmt], label_filename), "w") as f:
+            f.write("\n".join(lines))
     
     return layout, annotations
 
+def remove_extra_labels(fmt):
+    """Supprime le dossier labels_<fmt>/ d'un run précédent ; renvoie le nombre de labels supprimés"""
+    labels_dir = YOLO_EXTRA_LABELS_DIRS[fmt]
+    if not os.path.isdir(labels_dir):
+        return 0
+    removed = glob(os.path.join(labels_dir, "*.txt"))
+    for path in removed:
+        os.remove(path)
+    if not os.listdir(labels_dir):
+        os.rmdir(labels_dir)
+    return len(removed)
+
+# ----- Mode streaming (augmentation en mémoire) -----
+def shuffled_groups(items, group_size=8, buffer_size=512, rng=None):
+    """
+    Regroupe un flux de cartes par paquets de group_size dans un ordre aléatoire,
+    via un tampon de mélange borné (pas besoin de matérialiser tout le flux).
+
+    rng : générateur propre au mélange (random.Random). Le rendu des layouts réinitialise
+    le random global en séquentiel mais pas en parallèle : le mélange ne doit pas en dépendre.
+    """
+    rng = rng or random.Random()
+    buffer = []
+    group = []
+    for item in items:
+        buffer.append(item)
+        if len(buffer) < buffer_size:
+            continue
+        # Tirage d'un élément au hasard dans le tampon (échange avec le dernier)
+        k = rng.randrange(len(buffer))
+        buffer[k], buffer[-1] = buffer[-1], buffer[k]
+        group.append(buffer.pop())
+        if len(group) == group_size:
+            yield group
+            group = []
+    rng.shuffle(buffer)
+    for item in buffer:
+        group.append(item)
+        if len(group) == group_size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+# ----- Génération parallèle des layouts -----
+# État partagé des workers (cartes, fonds, classes), initialisé une fois par processus
+_LAYOUT_STATE = {}
+
+def layout_seed(root_seed, group_index):
+    """Graine d'un layout, dérivée de la graine racine et de son numéro"""
+    return int(np.random.SeedSequence([root_seed, group_index]).generate_state(1)[0])
+
+def layout_options(args, background_file=None):
+    """Réglages communs à tous les layouts d'un run (transmis une fois à chaque worker)"""
+    return {
+        "background_file": background_file,
+        "canvas_size": args.canvas,
+        "web_dir": args.web_dir,
+        "bg_cache_mb": args.bg_cache_mb,
+        "max_overlap": args.max_overlap,
+        "min_visible": args.min_visible,
+        "verbose": args.verbose,
+        "annotations": args.annotations is not None,
+        "shards": args.shards is not None,
+        "label_formats": [fmt for fmt in LABEL_FORMATS if getattr(args, fmt)],
+    }
+
+def _init_layout_state(cards, fake_images, card_dict, class_map, options):
+    canvas_size = options["canvas_size"]
+    scale = canvas_scale(canvas_size)
+    if scale != 1.0:
+        # Les fausses cartes sont posées ~100 fois par fond : mises à l'échelle une seule fois
+        fake_images = scale_cards(fake_images, scale)
+    _LAYOUT_STATE.update(options)
+    _LAYOUT_STATE.update(cards=cards, fake_images=fake_images, card_dict=card_dict, class_map=class_map,
+                         background_pool=None, web_backgrounds=None,
+                         local_backgrounds=BackgroundProvider(MOSAIC_DIR, canvas_size, options["bg_cache_mb"]))
+
+def _init_layout_worker(card_stack_file, fake_stack_file, card_dict, class_map, options):
+    # Un seul thread OpenCV par worker ; les cartes sont relues par mmap
+    cv2.setNumThreads(1)
+    try:
+        _init_layout_state(open_stack(card_stack_file), open_stack(fake_stack_file), card_dict, class_map, options)
+    except Exception as e:
+        # Une exception dans l'initialiseur ferait relancer le worker sans fin par Pool :
+        # elle est gardée et levée à la première tâche, ce qui interrompt le run
+        _LAYOUT_STATE["init_error"] = e
+
+def _check_worker_state():
+    error = _LAYOUT_STATE.get("init_error")
+    if error is not None:
+        raise RuntimeError(f"Initialisation du worker impossible : {error!r}") from error
+
+def _background_pool():
+    # Ouverture paresseuse : le pool est écrit par les mêmes workers avant les premiers layouts
+    if _LAYOUT_STATE["background_pool"] is None and _LAYOUT_STATE["background_file"]:
+        _LAYOUT_STATE["background_pool"] = np.load(_LAYOUT_STATE["background_file"], mmap_mode="r")
+    return _LAYOUT_STATE["background_pool"]
+
+def _web_backgrounds():
+    # Index du corpus web ouvert une fois par processus (construit par le parent)
+    if _LAYOUT_STATE["web_backgrounds"] is None:
+        _LAYOUT_STATE["web_backgrounds"] = BackgroundIndex(_LAYOUT_STATE["web_dir"], _LAYOUT_STATE["canvas_size"])
+    return _LAYOUT_STATE["web_backgrounds"]
+
+def render_layout(job):
+    """
+    Génère un layout complet à partir de sa graine. Le même job produit la même
+    image quel que soit le processus qui l'exécute.
+
+    Args:
+        job: (group_index, layout_mode, background_mode, transform_mode, seed, card_rows, group)
+             - card_rows : indices des cartes dans le pool, None = 8 cartes tirées au hasard
+             - group : cartes (image, chemin) déjà choisies (mode --stream), prioritaire
+
+    Returns:
+        (group_index, layout_mode, background_mode, transform_mode), l'enregistrement
+        JSONL du layout (None si --annotations n'est pas demandé) et, avec --shards,
+        les fichiers à écrire par le parent, {extension: contenu} (None sinon)
+    """
+    group_index, layout_mode, background_mode, transform_mode, seed, card_rows, group = job
+    _check_worker_state()
+    random.seed(seed)
+    np.random.seed(seed)
+    cards = _LAYOUT_STATE["cards"]
+    details = [] if _LAYOUT_STATE["annotations"] else None
+    extra_labels = {fmt: [] for fmt in _LAYOUT_STATE["label_formats"]}
+    if group is None:
+        if card_rows is None:
+            group = [random.choice(cards) for _ in range(8)]
+        else:
+            group = [cards[k] for k in card_rows]
+    layout, annotations = create_layout_group(group, group_index, _LAYOUT_STATE["card_dict"], _LAYOUT_STATE["class_map"],
+                        _LAYOUT_STATE["class_map"], _LAYOUT_STATE["fake_images"],
+                        layout_mode=layout_mode, background_mode=background_mode, transform_mode=transform_mode,
+                        background_pool=_background_pool() if background_mode == 0 else None,
+                        canvas_size=_LAYOUT_STATE["canvas_size"],
+                        web_backgrounds=_web_backgrounds() if background_mode == 2 else None,
+                        local_backgrounds=_LAYOUT_STATE["local_backgrounds"],
+                        max_overlap=_LAYOUT_STATE["max_overlap"], min_visible=_LAYOUT_STATE["min_visible"],
+                        verbose=_LAYOUT_STATE["verbose"], details=details,
+                        save=not _LAYOUT_STATE["shards"], extra_labels=extra_labels)
+    payload = None
+    if _LAYOUT_STATE["shards"]:
+        # Même encodage que cv2.imwrite : octets identiques aux fichiers de images/
+        payload = {".png": cv2.imencode(".png", layout)[1].tobytes(),
+                   ".txt": "\n".join(annotations).encode("utf-8")}
+        for fmt, lines in extra_labels.items():
+            payload[f".{fmt}.txt"] = "\n".join(lines).encode("utf-8")
+    record = None
+    if details is not None:
+        record = {"image": f"layout_{group_index:03d}.png", "layout_mode": layout_mode,
+                  "background_mode": background_mode, "transform_mode": transform_mode,
+                  "seed": seed, "annotations": details}
+    return job[:4], record, payload
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Génération de mosaïques YOLO")
+    parser.add_argument("layout_mode", nargs="?", default="1",
+                        help="Layout mode (1, 2, 3, 4 = placement dense) ou 'all' pour toutes les combinaisons")
+    parser.add_argument("background_mode", nargs="?", type=int, default=0, help="Background mode (0, 1, 2)")
+    parser.add_argument("transform_mode", nargs="?", type=int, default=0, help="Transform mode (0, 1)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Augmente les cartes en mémoire (augmentation.py) au lieu de relire output/augmented/images ; "
+                             "aucune image de carte intermédiaire n'est écrite")
+    parser.add_argument("--num_aug", type=int, default=30, help="Mode --stream : augmentations par carte de base")
+    parser.add_argument("--aug_seed", type=int, default=None, help="Mode --stream : graine racine de l'augmentation")
+    parser.add_argument("--aug_workers", type=int, default=1, help="Mode --stream : processus d'augmentation")
+    parser.add_argument("--aug_holo", type=float, default=0.0,
+                        help="Mode --stream : probabilité d'effet holographique par carte augmentée")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processus de génération des layouts (1 = séquentiel, 0 = tous les coeurs)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Graine racine des layouts (sortie identique quel que soit --workers)")
+    parser.add_argument("--pack_cards", type=int, default=PACK_CARDS,
+                        help=f"Layout mode 4 : cartes par layout (défaut: {PACK_CARDS})")
+    parser.add_argument("--max_overlap", type=float, default=MAX_OVERLAP,
+                        help=f"Layout mode 4 : part maximale d'une carte posée sur les précédentes (défaut: {MAX_OVERLAP})")
+    parser.add_argument("--min_visible", type=float, default=MIN_VISIBLE,
+                        help=f"Layout mode 4 : fraction visible minimale pour garder le label (défaut: {MIN_VISIBLE})")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("--verbose", action="store_true",
+                           help="Affiche chaque layout et chaque annotation (ancien comportement)")
+    verbosity.add_argument("--quiet", action="store_true",
+                           help="N'affiche que le bilan final (pas de progression)")
+    parser.add_argument("--annotations", default=None, metavar="JSONL",
+                        help="Écrit le détail des annotations (polygones, boîtes, visibilité) "
+                             "dans ce fichier JSONL, une ligne par layout")
+    parser.add_argument("--canvas", type=parse_canvas_size, default=CANVAS_SIZE,
+                        help="Taille des layouts : LxH ou largeur seule au ratio 16:9 (ex. 640 -> 640x360). "
+                             "Les cartes sont rendues directement à cette échelle (défaut: 1920x1080)")
+    parser.add_argument("--web_dir", default=WEB_DIR,
+                        help="Corpus local du background mode 2, rempli par 'python core/backgrounds.py prefetch' "
+                             f"(défaut: {WEB_DIR})")
+    parser.add_argument("--bg_cache_mb", type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help=f"Mémoire des fonds locaux (background mode 1) décodés, par processus "
+                             f"(défaut: {DEFAULT_MEMORY_BUDGET_MB} Mo)")
+    parser.add_argument("--seg", action="store_true",
+                        help="Écrit aussi les polygones des cartes (labels de segmentation YOLO) "
+                             f"dans {YOLO_EXTRA_LABELS_DIRS['seg']}/")
+    parser.add_argument("--obb", action="store_true",
+                        help="Écrit aussi les boîtes orientées (labels YOLO-OBB) "
+                             f"dans {YOLO_EXTRA_LABELS_DIRS['obb']}/")
+    parser.add_argument("--shards", type=float, nargs="?", const=DEFAULT_SHARD_MB, default=None, metavar="MB",
+                        help=f"Écrit les layouts dans des shards tar de MB Mo (défaut: {DEFAULT_SHARD_MB}) sous "
+                             f"{os.path.join(YOLO_OUTPUT_DIR, SHARD_DIR)}/ au lieu de images/ + labels/")
+    parser.add_argument("--bg_pool", type=int, default=BACKGROUND_POOL_SIZE,
+                        help="Fonds mosaïque (background mode 0) pré-rendus puis réutilisés avec recadrage/miroir "
+                             "aléatoires (0 = un fond recalculé par layout)")
+    return parser.parse_args(argv)
+
 # ----- Fonction principale -----
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+    all_mode = args.layout_mode.lower() == "all"
     # Chargement des données des cartes depuis Excel
     card_dict, class_map = load_card_data("cards_info.xlsx")
     
     # Utilisation directe de class_map sans fusion des noms
     # Chaque numéro de carte a son propre ID unique (252 IDs au total)
     
-    # Collecte des images depuis "output/augmented/images"
-    image_paths = []
-    for d in [os.path.join("output", "augmented", "images")]:
-        image_paths += glob(os.path.join(d, "*.jpg"))
-        image_paths += glob(os.path.join(d, "*.png"))
-    resized_images = resize_cards(image_paths)
+    root_seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+    safe_print(f"Graine racine : {root_seed} (--seed {root_seed} pour reproduire ce run)")
+    random.seed(root_seed)
+    workers = args.workers if args.workers > 0 else multiprocessing.cpu_count()
+
+    card_stream = None
+    card_stack_file = None
+    if args.stream:
+        # Import tardif : imgaug n'est nécessaire qu'en mode streaming
+        try:
+            from . import augmentation
+        except ImportError:
+            import augmentation
+        card_stream = augmentation.iter_augmented_cards(num_aug=args.num_aug, root_seed=args.aug_seed,
+                                                        workers=args.aug_workers, holo_prob=args.aug_holo)
+        if all_mode:
+            # Le mode ALL tire les cartes au hasard dans tout le pool : on le matérialise
+            resized_images = list(card_stream)
+        else:
+            # Les fonds de secours utilisent les cartes de base, le flux n'est pas encore produit
+            _, paths, card_stack_file = card_stack(sorted(glob(os.path.join("images", "*.png")) +
+                                                          glob(os.path.join("images", "*.jpg"))))
+            resized_images = open_stack(card_stack_file) if card_stack_file else []
+    else:
+        # Collecte des images depuis "output/augmented/images"
+        image_paths = []
+        for d in [os.path.join("output", "augmented", "images")]:
+            for ext in IMAGE_EXTENSIONS:
+                image_paths += glob(os.path.join(d, f"*{ext}"))
+        image_paths.sort()
+        _, paths, card_stack_file = card_stack(image_paths)
+        resized_images = open_stack(card_stack_file) if card_stack_file else []
     if not resized_images:
         safe_print("Aucune image valide trouvée dans les répertoires d'images!")
         return
 
-    fake_image_paths = glob(os.path.join(FAKE_DIR, "*.png"))
-    fake_image_paths += glob(os.path.join(FAKE_DIR, "*.jpg"))
-    fake_images = resize_cards(fake_image_paths)
+    fake_image_paths = []
+    for ext in IMAGE_EXTENSIONS:
+        fake_image_paths += glob(os.path.join(FAKE_DIR, f"*{ext}"))
+    _, _, fake_stack_file = card_stack(sorted(fake_image_paths))
+    fake_images = open_stack(fake_stack_file) if fake_stack_file else []
     
     # Si pas de fausses cartes, utiliser les vraies cartes comme fonds
     if not fake_images:
@@ -407,53 +817,165 @@ def main():
             safe_print("❌ Aucune image disponible pour les fonds!")
             return
 
+    temp_stack_file = None
+    if workers > 1 and card_stack_file is None:
+        # Cartes produites en mémoire (--stream ALL) : pile temporaire relue par mmap dans les workers
+        temp_stack_file = os.path.join(CACHE_DIR, f"stream_{os.getpid()}.npy")
+        save_stack(temp_stack_file, [img for img, _ in resized_images], [name for _, name in resized_images])
+        card_stack_file = temp_stack_file
+    if fake_stack_file is None:
+        fake_stack_file = card_stack_file
+
+    # Pool de fonds mosaïque : rendu une fois (en parallèle si --workers), relu par mmap ensuite
+    background_file = None
+    background_jobs = []
+    # Réutilisable d'un run à l'autre seulement avec --seed et des fausses cartes sur disque
+    keep_backgrounds = args.seed is not None and fake_stack_file not in (None, temp_stack_file)
+    if args.bg_pool > 0 and (all_mode or args.background_mode == 0):
+        if keep_backgrounds:
+            background_file = background_pool_file(fake_stack_file, args.bg_pool, root_seed, *args.canvas)
+        else:
+            background_file = os.path.join(BACKGROUND_CACHE_DIR, f"backgrounds_{os.getpid()}.npy")
+        if os.path.exists(background_file):
+            # Pool réutilisé : marqué comme récent pour le ménage du dossier
+            os.utime(background_file)
+        else:
+            background_jobs = [(i, background_seed(root_seed, i), *args.canvas) for i in range(args.bg_pool)]
+
     group_index = 1
+    jobs = []
     # Mode ALL pour générer toutes les variations
-    if len(sys.argv) > 1 and sys.argv[1].lower() == "all":
+    if all_mode:
         safe_print("Mode ALL activé : génération de toutes les variations...")
         for lm in [1, 2, 3]:
             for bm in [0, 1, 2]:
                 for tm in [0, 1]:
                     for i in range(NUM_VARIATIONS_ALL):
-                        group = [random.choice(resized_images) for _ in range(8)]
-                        create_layout_group(group, group_index, card_dict, class_map, class_map, fake_images,
-                                            layout_mode=lm, background_mode=bm, transform_mode=tm)
-                        safe_print(f"Variation {group_index} générée pour (layout_mode={lm}, background_mode={bm}, transform_mode={tm})")
+                        jobs.append((group_index, lm, bm, tm, layout_seed(root_seed, group_index), None, None))
                         group_index += 1
-        safe_print("Génération ALL terminée !")
     else:
-        layout_mode = int(sys.argv[1]) if len(sys.argv) > 1 else 1
-        background_mode = int(sys.argv[2]) if len(sys.argv) > 2 else 0
-        transform_mode = int(sys.argv[3]) if len(sys.argv) > 3 else 0
-        safe_print("Layout mode choisi :", layout_mode)
-        safe_print("Background mode choisi :", background_mode)
-        safe_print("Transform mode choisi :", transform_mode)
-        random.shuffle(resized_images)
-        groups = [resized_images[i:i+8] for i in range(0, len(resized_images), 8)]
-        for group in groups:
-            create_layout_group(group, group_index, card_dict, class_map, class_map, fake_images,
-                                layout_mode=layout_mode, background_mode=background_mode, transform_mode=transform_mode)
-            safe_print(f"Groupe {group_index} traité.")
-            group_index += 1
-        safe_print("Génération terminée pour tous les groupes !")
+        layout_mode = int(args.layout_mode)
+        background_mode = args.background_mode
+        transform_mode = args.transform_mode
+        safe_print(f"Layout mode choisi : {layout_mode}")
+        safe_print(f"Background mode choisi : {background_mode}")
+        safe_print(f"Transform mode choisi : {transform_mode}")
+        cards_per_layout = args.pack_cards if layout_mode == 4 else 8
+        if card_stream is not None:
+            # Les cartes augmentées sont consommées au fil de leur génération
+            groups = ((None, group) for group in shuffled_groups(card_stream, cards_per_layout,
+                                                                      rng=random.Random(root_seed)))
+        else:
+            rows = list(range(len(resized_images)))
+            random.shuffle(rows)
+            groups = ((rows[i:i+cards_per_layout], None) for i in range(0, len(rows), cards_per_layout))
+        # Générateur : en mode --stream, un groupe n'est formé qu'au moment d'être rendu
+        jobs = ((index, layout_mode, background_mode, transform_mode, layout_seed(root_seed, index), card_rows, group)
+                for index, (card_rows, group) in enumerate(groups, start=group_index))
+
+    if all_mode:
+        total = len(jobs)
+    elif card_stream is None:
+        total = -(-len(resized_images) // cards_per_layout)
+    else:
+        total = None  # --stream : nombre de layouts inconnu à l'avance
+    progress = ProgressReporter(total, label="Layouts", enabled=not args.quiet)
+    annotations_file = None
+    if args.annotations:
+        os.makedirs(os.path.dirname(args.annotations) or ".", exist_ok=True)
+        annotations_file = open(args.annotations, "w", encoding="utf-8")
+    shard_writer = None
+    if args.shards is not None:
+        shard_writer = ShardWriter(os.path.join(YOLO_OUTPUT_DIR, SHARD_DIR), args.shards)
+    elif remove_shards(os.path.join(YOLO_OUTPUT_DIR, SHARD_DIR)):
+        # Le validateur et l'exporteur liraient sinon les shards d'un run précédent
+        safe_print(f"Shards d'un run précédent supprimés de {os.path.join(YOLO_OUTPUT_DIR, SHARD_DIR)}/")
+    for fmt in LABEL_FORMATS:
+        if not getattr(args, fmt) and remove_extra_labels(fmt):
+            # Labels --seg/--obb d'un run précédent : ils ne correspondraient plus aux images
+            safe_print(f"Labels {fmt} d'un run précédent supprimés de {YOLO_EXTRA_LABELS_DIRS[fmt]}/")
+
+    def report(done):
+        (idx, lm, bm, tm), record, payload = done
+        if args.verbose:
+            if all_mode:
+                safe_print(f"Variation {idx} générée pour (layout_mode={lm}, background_mode={bm}, transform_mode={tm})")
+            else:
+                safe_print(f"Groupe {idx} traité.")
+        if annotations_file is not None:
+            annotations_file.write(json.dumps(record) + "\n")
+        if shard_writer is not None:
+            shard_writer.write(f"layout_{idx:03d}", payload)
+        progress.update()
+
+    if all_mode or args.background_mode == 2:
+        # Indexation (décodage + redimensionnement) une seule fois, avant de lancer les workers
+        web_backgrounds = BackgroundIndex(args.web_dir, args.canvas)
+        if len(web_backgrounds):
+            safe_print(f"Fonds web : {len(web_backgrounds)} images indexées depuis {args.web_dir}/")
+        else:
+            safe_print(f"⚠️ Aucun fond dans {args.web_dir}/ : fond blanc pour le background mode 2 "
+                       "(remplir le corpus avec 'python core/backgrounds.py prefetch')")
+
+    pool = None
+    try:
+        if workers > 1:
+            safe_print(f"Génération parallèle sur {workers} processus")
+            pool = multiprocessing.Pool(workers, initializer=_init_layout_worker,
+                                        initargs=(card_stack_file, fake_stack_file, card_dict, class_map,
+                                                  layout_options(args, background_file)))
+            run = pool.imap
+        else:
+            _init_layout_state(resized_images, fake_images, card_dict, class_map,
+                               layout_options(args, background_file))
+            run = map
+        if background_jobs:
+            safe_print(f"Pré-rendu de {len(background_jobs)} fonds mosaïque...")
+            backgrounds = list(run(render_background, background_jobs))
+            save_stack(background_file, backgrounds, [f"background_{i:03d}" for i in range(len(backgrounds))])
+            if keep_backgrounds:
+                prune_stacks(BACKGROUND_CACHE_DIR, MAX_BACKGROUND_POOLS, MAX_BACKGROUND_CACHE_MB,
+                             BACKGROUND_POOL_PATTERN)
+        for done in run(render_layout, jobs):
+            report(done)
+        progress.close()
+    except BaseException:
+        if pool is not None:
+            # Erreur dans un worker ou interruption : les tâches restantes sont abandonnées
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if annotations_file is not None:
+            annotations_file.close()
+        if shard_writer is not None:
+            shard_writer.close()
+        temp_files = [temp_stack_file] if temp_stack_file else []
+        if background_file and not keep_backgrounds:
+            temp_files.append(background_file)
+        for temp_file in temp_files:
+            for path in (temp_file, temp_file[:-4] + ".json"):
+                if os.path.exists(path):
+                    os.remove(path)
+    safe_print("Génération ALL terminée !" if all_mode else "Génération terminée pour tous les groupes !")
+    if shard_writer is not None:
+        safe_print(f"Shards : {len(shard_writer.samples)} layouts dans {len(shard_writer.shards)} fichiers tar "
+                   f"({shard_writer.shard_dir})")
     
     # Génération du fichier YAML pour YOLOv8 avec IDs = numéros de carte
     yaml_path = os.path.join(YOLO_OUTPUT_DIR, "data.yaml")
     with open(yaml_path, "w") as f:
         f.write("train: images\n")
         f.write("val: images\n")
-        # Le nombre de classes correspond au plus grand ID (ex: 191 pour carte 191/191)
-        max_id = max(class_map.values())
-        f.write(f"nc: {max_id + 1}\n")  # +1 car YOLO compte l'ID 0 aussi
-        f.write("names:\n")
-        # On crée une liste avec des indices de 0 à max_id
-        names_list = ["unused"] * (max_id + 1)
-        for card_num, class_id in class_map.items():
-            names_list[class_id] = card_dict[card_num]
-        for name in names_list:
-            f.write(f"  - {name}\n")
+        # nc = plus grand ID + 1 (ex: 192 pour carte 191/191), l'ID 0 est "unused"
+        for line in load_class_registry("cards_info.xlsx").yaml_lines():
+            f.write(f"{line}\n")
     safe_print(f"Fichier YAML généré : {yaml_path}")
     safe_print(f"IDs utilisés: {min(class_map.values())} à {max(class_map.values())}")
 
 if __name__ == "__main__":
+    # Nécessaire pour multiprocessing dans l'exécutable PyInstaller (Windows)
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Format de dataset en shards tar (style WebDataset)
+Les images et labels d'un dataset YOLO sont regroupés dans quelques gros fichiers
+tar de taille fixe (layout_001.png + layout_001.txt côte à côte), avec un index
+JSON donnant la position de chaque fichier pour un accès direct. Copier ou
+synchroniser un dataset revient à quelques copies séquentielles.
+
+Usage:
+    python core/shards.py pack output/yolov8                # images/ + labels/ -> shards/
+    python core/shards.py extract output/yolov8/shards out/ # shards/ -> images/ + labels/
+    python core/shards.py info output/yolov8/shards
+"""
+import io
+import os
+import sys
+import json
+import tarfile
+import argparse
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+try:
+    from .utils import safe_print
+except ImportError:
+    from utils import safe_print
+
+# Sous-dossier des shards dans un dataset (à côté de images/ et labels/)
+SHARD_DIR = "shards"
+INDEX_NAME = "index.json"
+DEFAULT_SHARD_MB = 256
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".webp"]
+
+
+class Sample(NamedTuple):
+    """Une image du dataset et son label, quelle que soit la disposition sur disque"""
+    name: str             # nom du fichier image (ex. layout_001.png)
+    image: bytes          # image encodée
+    label: Optional[str]  # contenu du label YOLO, None si absent
+    source: str           # chemin de l'image ou shard:membre (messages d'erreur)
+    label_source: str     # chemin du label ou shard:membre
+
+
+def split_key(member_name: str):
+    """'layout_001.png' -> ('layout_001', '.png') ; la clé s'arrête au premier point"""
+    base = os.path.basename(member_name)
+    key, dot, ext = base.partition(".")
+    return key, dot + ext
+
+
+def label_dir_name(ext: str) -> str:
+    """Dossier des labels d'une extension : '.txt' -> 'labels', '.seg.txt' -> 'labels_seg'"""
+    variant = ext[1:-len(".txt")].rstrip(".")
+    return f"labels_{variant}" if variant else "labels"
+
+
+class ShardWriter:
+    """
+    Écrit des échantillons {extension: contenu} dans des shards tar de taille bornée
+
+    Les shards sont nommés shard-000000.tar, shard-000001.tar... ; l'index est écrit
+    par close() (ou en sortie de bloc with).
+    """
+
+    def __init__(self, shard_dir: str, max_size_mb: float = DEFAULT_SHARD_MB, prefix: str = "shard"):
+        """
+        Args:
+            shard_dir: Dossier des shards (créé si besoin, shards existants remplacés)
+            max_size_mb: Taille maximale d'un shard (Mo) ; un échantillon n'est jamais coupé
+            prefix: Préfixe des fichiers tar
+        """
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        for old in self.shard_dir.glob(f"{prefix}-*.tar"):
+            old.unlink()
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.prefix = prefix
+        self.shards: List[Dict] = []
+        self.samples: Dict[str, Dict] = {}
+        self._tar: Optional[tarfile.TarFile] = None
+
+    def _open_next(self):
+        if self._tar is not None:
+            self._tar.close()
+        name = f"{self.prefix}-{len(self.shards):06d}.tar"
+        self._tar = tarfile.open(self.shard_dir / name, "w", format=tarfile.USTAR_FORMAT)
+        self.shards.append({"name": name, "count": 0, "size": 0})
+
+    def write(self, key: str, files: Dict[str, bytes]) -> None:
+        """
+        Ajoute un échantillon
+
+        Args:
+            key: Clé de l'échantillon (nom de fichier sans extension)
+            files: Contenu par extension, ex. {".png": ..., ".txt": ...}
+        """
+        if key in self.samples:
+            raise ValueError(f"Clé déjà présente dans les shards : {key}")
+        # Un bloc d'en-tête tar par fichier, contenu arrondi au bloc
+        sample_size = sum(tarfile.BLOCKSIZE * (1 + -(-len(data) // tarfile.BLOCKSIZE)) for data in files.values())
+        current = self.shards[-1] if self.shards else None
+        if current is None or (current["count"] and current["size"] + sample_size > self.max_size):
+            self._open_next()
+            current = self.shards[-1]
+        members = {}
+        for ext, data in files.items():
+            info = tarfile.TarInfo(key + ext)
+            info.size = len(data)
+            info.mode = 0o644
+            self._tar.addfile(info, io.BytesIO(data))
+            # Le contenu se termine (bourrage compris) à la position courante de l'archive
+            blocks = -(-info.size // tarfile.BLOCKSIZE)
+            members[ext] = [self._tar.offset - blocks * tarfile.BLOCKSIZE, info.size]
+        current["count"] += 1
+        current["size"] += sample_size
+        self.samples[key] = {"shard": len(self.shards) - 1, "members": members}
+
+    def close(self) -> None:
+        """Ferme le dernier shard et écrit l'index"""
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+        for shard in self.shards:
+            shard["size"] = os.path.getsize(self.shard_dir / shard["name"])
+        index = {"format": "yolo-tar", "version": 1, "shards": self.shards, "samples": self.samples}
+        tmp = self.shard_dir / (INDEX_NAME + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, self.shard_dir / INDEX_NAME)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardReader:
+    """Lecture séquentielle ou par clé des shards écrits par ShardWriter"""
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = Path(shard_dir)
+        with open(self.shard_dir / INDEX_NAME, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self.shards: List[Dict] = index["shards"]
+        self.samples: Dict[str, Dict] = index["samples"]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def keys(self) -> List[str]:
+        return list(self.samples)
+
+    def read(self, key: str) -> Dict[str, bytes]:
+        """Contenu d'un échantillon par extension (accès direct via les offsets de l'index)"""
+        entry = self.samples[key]
+        files = {}
+        with open(self.shard_dir / self.shards[entry["shard"]]["name"], "rb") as f:
+            for ext, (offset, size) in entry["members"].items():
+                f.seek(offset)
+                files[ext] = f.read(size)
+        return files
+
+    def __iter__(self) -> Iterator:
+        """Parcourt les échantillons shard par shard, en lecture séquentielle : (clé, {extension: contenu})"""
+        for shard in self.shards:
+            key, files = None, {}
+            with tarfile.open(self.shard_dir / shard["name"], "r") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    member_key, ext = split_key(member.name)
+                    if key is not None and member_key != key:
+                        yield key, files
+                        files = {}
+                    key = member_key
+                    files[ext] = tar.extractfile(member).read()
+            if key is not None:
+                yield key, files
+
+
+def remove_shards(shard_dir: str, prefix: str = "shard") -> int:
+    """
+    Supprime les shards et l'index d'un dossier (écrits par ShardWriter)
+
+    Les lecteurs préfèrent les shards aux dossiers images/ + labels/ : un run écrit
+    en dossiers doit retirer ceux d'un run précédent.
+
+    Returns:
+        Nombre de shards supprimés
+    """
+    shard_dir = Path(shard_dir)
+    if not shard_dir.is_dir():
+        return 0
+    index = shard_dir / INDEX_NAME
+    if index.exists():
+        index.unlink()
+    removed = 0
+    for old in shard_dir.glob(f"{prefix}-*.tar"):
+        old.unlink()
+        removed += 1
+    return removed
+
+
+def find_shard_dir(dataset_dir: str) -> Optional[Path]:
+    """Dossier des shards d'un dataset (le dossier lui-même ou son sous-dossier shards/), None sinon"""
+    for candidate in (Path(dataset_dir), Path(dataset_dir) / SHARD_DIR):
+        if (candidate / INDEX_NAME).exists():
+            return candidate
+    return None
+
+
+def iter_samples(dataset_dir: str) -> Iterator[Sample]:
+    """
+    Parcourt les images d'un dataset YOLO, en shards ou en dossiers images/ + labels/
+
+    Args:
+        dataset_dir: Dossier du dataset
+
+    Yields:
+        Sample (nom, image encodée, label ou None, sources de l'image et du label)
+    """
+    shard_dir = find_shard_dir(dataset_dir)
+    if shard_dir is not None:
+        reader = ShardReader(shard_dir)
+        for key, files in reader:
+            images = [ext for ext in files if ext.lower() in IMAGE_EXTENSIONS]
+            if not images:
+                continue
+            label = files.get(".txt")
+            shard_path = shard_dir / reader.shards[reader.samples[key]["shard"]]["name"]
+            yield Sample(key + images[0], files[images[0]], None if label is None else label.decode("utf-8"),
+                         f"{shard_path}:{key}{images[0]}", f"{shard_path}:{key}.txt")
+        return
+
+    images_dir = Path(dataset_dir) / "images"
+    labels_dir = Path(dataset_dir) / "labels"
+    for img_path in _image_files(images_dir):
+        label_path = labels_dir / (img_path.stem + ".txt")
+        label = label_path.read_text() if label_path.exists() else None
+        yield Sample(img_path.name, img_path.read_bytes(), label, str(img_path), str(label_path))
+
+
+def count_samples(dataset_dir: str) -> int:
+    """Nombre d'images du dataset (sans lire les images)"""
+    shard_dir = find_shard_dir(dataset_dir)
+    if shard_dir is not None:
+        return len(ShardReader(shard_dir))
+    return len(_image_files(Path(dataset_dir) / "images"))
+
+
+def _image_files(images_dir: Path) -> List[Path]:
+    # Images d'un dossier images/ (extensions de IMAGE_EXTENSIONS, casse ignorée), triées
+    if not images_dir.is_dir():
+        return []
+    return sorted(path for path in images_dir.iterdir()
+                  if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def pack_directory(dataset_dir: str, shard_dir: Optional[str] = None, max_size_mb: float = DEFAULT_SHARD_MB) -> int:
+    """Regroupe images/ + labels/ d'un dataset en shards ; renvoie le nombre d'échantillons"""
+    shard_dir = shard_dir or os.path.join(dataset_dir, SHARD_DIR)
+    extra_dirs = sorted(path for path in Path(dataset_dir).glob("labels_*") if path.is_dir())
+    count = 0
+    with ShardWriter(shard_dir, max_size_mb) as writer:
+        for sample in sorted(iter_samples(dataset_dir), key=lambda s: s.name):
+            key, ext = split_key(sample.name)
+            files = {ext: sample.image}
+            if sample.label is not None:
+                files[".txt"] = sample.label.encode("utf-8")
+            # Labels supplémentaires (labels_seg/, labels_obb/...) : membres .seg.txt, .obb.txt
+            for extra_dir in extra_dirs:
+                extra_label = extra_dir / (key + ".txt")
+                if extra_label.exists():
+                    files[f".{extra_dir.name[len('labels_'):]}.txt"] = extra_label.read_bytes()
+            writer.write(key, files)
+            count += 1
+    return count
+
+
+def extract_shards(shard_dir: str, output_dir: str) -> int:
+    """Restaure images/ + labels/ (et labels_seg/, labels_obb/...) depuis des shards ; renvoie le nombre d'échantillons"""
+    images_dir = Path(output_dir) / "images"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    (Path(output_dir) / "labels").mkdir(parents=True, exist_ok=True)
+    count = 0
+    for key, files in ShardReader(shard_dir):
+        for ext, data in files.items():
+            if ext.endswith(".txt"):
+                target = Path(output_dir) / label_dir_name(ext)
+                target.mkdir(exist_ok=True)
+                (target / (key + ".txt")).write_bytes(data)
+            else:
+                (images_dir / (key + ext)).write_bytes(data)
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shards tar de datasets YOLO")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="images/ + labels/ -> shards/")
+    pack.add_argument("dataset_dir")
+    pack.add_argument("--shard_dir", default=None, help="Dossier des shards (défaut: <dataset>/shards)")
+    pack.add_argument("--shard_mb", type=float, default=DEFAULT_SHARD_MB,
+                      help=f"Taille maximale d'un shard en Mo (défaut: {DEFAULT_SHARD_MB})")
+    extract = sub.add_parser("extract", help="shards/ -> images/ + labels/")
+    extract.add_argument("shard_dir")
+    extract.add_argument("output_dir")
+    info = sub.add_parser("info", help="Résumé d'un dossier de shards")
+    info.add_argument("shard_dir")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        count = pack_directory(args.dataset_dir, args.shard_dir, args.shard_mb)
+        safe_print(f"✅ {count} échantillons regroupés dans {args.shard_dir or os.path.join(args.dataset_dir, SHARD_DIR)}")
+    elif args.command == "extract":
+        count = extract_shards(args.shard_dir, args.output_dir)
+        safe_print(f"✅ {count} échantillons extraits dans {args.output_dir}")
+    else:
+        reader = ShardReader(args.shard_dir)
+        total = sum(shard["size"] for shard in reader.shards)
+        safe_print(f"{len(reader)} échantillons, {len(reader.shards)} shards, {total / 1024 / 1024:.1f} Mo")
+        for shard in reader.shards:
+            safe_print(f"  {shard['name']} : {shard['count']} échantillons, {shard['size'] / 1024 / 1024:.1f} Mo")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
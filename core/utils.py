@@ -6,12 +6,17 @@ Contient les fonctions partagées pour éviter la duplication de code
 import os
 import sys
 import cv2
-import pandas as pd
 import numpy as np
 import re
+import time
 from glob import glob
 from typing import Dict, List, Tuple, Optional
 
+try:
+    from .class_registry import load_class_registry
+except ImportError:
+    from class_registry import load_class_registry
+
 # Correction pour NumPy 2.0 - centralisée ici
 np.float_ = np.float64
 
@@ -29,6 +34,57 @@ def safe_print(message=""):
         print(safe_message)
 
 
+class ProgressReporter:
+    """
+    Progression d'une boucle longue (compteur, débit, temps restant)
+
+    Une ligne est affichée au plus toutes les `interval` secondes, quel que soit le
+    nombre d'éléments traités : la console et le journal de la GUI (qui lit la sortie
+    ligne par ligne) ne ralentissent plus la génération.
+    """
+
+    def __init__(self, total: Optional[int] = None, label: str = "Progression", interval: float = 2.0,
+                 enabled: bool = True):
+        """
+        Args:
+            total: Nombre total d'éléments (None = inconnu, pas d'ETA)
+            label: Préfixe des lignes affichées
+            interval: Délai minimal entre deux lignes (secondes)
+            enabled: False = aucune ligne intermédiaire (seul close() affiche le bilan)
+        """
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.enabled = enabled
+        self.count = 0
+        self.start = time.monotonic()
+        self._last = self.start
+
+    def _line(self, now: float, eta: bool = True) -> str:
+        elapsed = now - self.start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        line = f"{self.label} : {self.count}" + (f"/{self.total}" if self.total else "") + f" ({rate:.1f}/s"
+        if eta and self.total and rate > 0:
+            remaining = int((self.total - self.count) / rate)
+            line += f", reste {remaining // 3600}:{remaining // 60 % 60:02d}:{remaining % 60:02d}"
+        return line + ")"
+
+    def update(self, n: int = 1) -> None:
+        """Compte n éléments terminés ; affiche une ligne si l'intervalle est écoulé"""
+        self.count += n
+        now = time.monotonic()
+        if self.enabled and now - self._last >= self.interval:
+            self._last = now
+            safe_print(self._line(now))
+            sys.stdout.flush()
+
+    def close(self) -> None:
+        """Affiche le bilan final (nombre, débit, durée)"""
+        now = time.monotonic()
+        safe_print(f"{self._line(now, eta=False)} en {now - self.start:.1f}s")
+        sys.stdout.flush()
+
+
 # Configuration globale
 CONFIG = {
     'target_size': (280, 380),
@@ -47,7 +103,8 @@ def load_card_data(excel_path: str = None) -> Tuple[Dict[str, str], Dict[str, in
         excel_path: Chemin vers le fichier Excel (par défaut CONFIG['excel_file'])
         
     Returns:
-        Tuple contenant (card_dict, class_map)
+        Tuple contenant (card_dict, class_map), class_map donnant l'ID YOLO de chaque
+        numéro de carte (= le numéro, comme dans les mosaïques et l'augmentation)
         
     Raises:
         FileNotFoundError: Si le fichier Excel n'existe pas
@@ -55,28 +112,16 @@ def load_card_data(excel_path: str = None) -> Tuple[Dict[str, str], Dict[str, in
     """
     if excel_path is None:
         excel_path = CONFIG['excel_file']
-        
-    if not os.path.exists(excel_path):
-        raise FileNotFoundError(f"Fichier Excel non trouvé : {excel_path}")
     
     try:
-        df = pd.read_excel(excel_path, usecols=["Set #", "Name"])
+        registry = load_class_registry(excel_path)
+    except FileNotFoundError:
+        raise
     except Exception as e:
+        import pandas as pd
         raise pd.errors.EmptyDataError(f"Erreur lors de la lecture du fichier Excel : {e}")
     
-    card_dict = {}
-    class_map = {}
-    class_id = 1
-    
-    for _, row in df.iterrows():
-        number = row["Set #"].split('/')[0].zfill(3)
-        name = row["Name"].replace(" ", "_")
-        if number not in card_dict:
-            card_dict[number] = name
-            class_map[number] = class_id
-            class_id += 1
-    
-    return card_dict, class_map
+    return registry.card_dict, registry.class_map
 
 def extract_card_number(filename: str) -> Optional[str]:
     """
@@ -93,31 +138,37 @@ def extract_card_number(filename: str) -> Optional[str]:
 
 def resize_cards(image_paths: List[str], target_size: Tuple[int, int] = None) -> List[Tuple[np.ndarray, str]]:
     """
-    Redimensionne les images aux dimensions cibles
+    Charge et redimensionne les images aux dimensions cibles.
+    Point d'entrée unique de chargement des cartes : passe par le cache disque
+    memory-mappé de card_cache (les PNG ne sont décodés qu'une fois).
     
     Args:
         image_paths: Liste des chemins d'images
         target_size: Taille cible (largeur, hauteur)
         
     Returns:
-        Liste de tuples (image_redimensionnée, chemin_original)
+        Liste de tuples (image_redimensionnée BGR en lecture seule, chemin_original)
     """
     if target_size is None:
         target_size = CONFIG['target_size']
     
-    resized_images = []
+    existing_paths = []
     for img_path in image_paths:
         if not os.path.exists(img_path):
             print(f"Attention: Image non trouvée : {img_path}")
             continue
-            
-        img = cv2.imread(img_path, cv2.IMREAD_UNCHANGED)
-        if img is None:
-            print(f"Attention: Impossible de charger l'image : {img_path}")
-            continue
-            
-        img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
-        resized_images.append((img, img_path))
+        existing_paths.append(img_path)
+    
+    try:
+        from .card_cache import load_cards
+    except ImportError:
+        from card_cache import load_cards
+    resized_images = load_cards(existing_paths, target_size)
+    if len(resized_images) < len(existing_paths):
+        loaded = {path for _, path in resized_images}
+        for img_path in existing_paths:
+            if img_path not in loaded:
+                print(f"Attention: Impossible de charger l'image : {img_path}")
     
     return resized_images
 
@@ -6,56 +6,30 @@ Génère 10 augmentations d'une seule carte pour comparaison visuelle.
 import os
 import sys
 import cv2
+import argparse
 import numpy as np
-import random
-import time
 from glob import glob
 
-# Patch NumPy pour imgaug
-if not hasattr(np, 'bool'):
-    np.bool = np.bool_
-if not hasattr(np, 'int'):
-    np.int = np.int_
-if not hasattr(np, 'float'):
-    np.float = np.float_
+# Pipeline, graines et décodage d'augmentation.py (mêmes variations qu'un vrai run)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "core"))
+import augmentation
+from card_cache import decode_card
 
-import imgaug.augmenters as iaa
-
-# Pipeline d'augmentation amélioré (identique à augmentation.py)
-seq = iaa.SomeOf((2, 5), [
-    # Luminosité et contraste
-    iaa.Add((-20, 20)),
-    iaa.Multiply((0.8, 1.2)),
-    iaa.LinearContrast((0.6, 1.6)),
-    iaa.GammaContrast((0.7, 1.5)),
-    
-    # Couleurs
-    iaa.AddToHueAndSaturation((-30, 30)),
-    iaa.ChangeColorTemperature((3000, 10000)),
-    iaa.MultiplyHueAndSaturation((0.8, 1.2)),
-    
-    # Flou et netteté
-    iaa.GaussianBlur((0, 2.0)),
-    iaa.AverageBlur(k=(1, 5)),
-    iaa.Sharpen(alpha=(0, 0.5), lightness=(0.8, 1.3)),
-    
-    # Bruit
-    iaa.AdditiveGaussianNoise(scale=(0, 0.05*255)),
-    iaa.ImpulseNoise(0.02),
-    iaa.SaltAndPepper(0.01),
-    
-    # Effets visuels
-    iaa.imgcorruptlike.Fog(severity=(1, 2)),
-    iaa.Posterize((5, 8)),
-    iaa.Emboss(alpha=(0, 0.3), strength=(0.5, 1.5)),
-    iaa.EdgeDetect(alpha=(0.0, 0.3)),
-    iaa.JpegCompression(compression=(50, 99)),
-    iaa.ElasticTransformation(alpha=(0, 5), sigma=0.5),
-], random_order=True)
+NUM_VARIATIONS = 10
 
 def main():
+    parser = argparse.ArgumentParser(description="Test de variété des augmentations")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Graine racine (reproductibilité, aléatoire si absente)")
+    parser.add_argument("--num_aug", type=int, default=augmentation.DEFAULT_NUM_AUG,
+                        help="--num_aug du run d'augmentation à reproduire (découpage des lots)")
+    parser.add_argument("--batch_size", type=int, default=augmentation.DEFAULT_BATCH_SIZE,
+                        help="--batch_size du run d'augmentation à reproduire")
+    args = parser.parse_args()
+    root_seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+    
     # Chercher une image dans le dossier images/
-    image_paths = glob(os.path.join("images", "*.png")) + glob(os.path.join("images", "*.jpg"))
+    image_paths = sorted(glob(os.path.join("images", "*.jpg")) + glob(os.path.join("images", "*.png")))
     
     if not image_paths:
         print("❌ Aucune image trouvée dans le dossier 'images/'")
@@ -65,18 +39,12 @@ def main():
     test_image_path = image_paths[0]
     print(f"🎯 Test avec l'image : {os.path.basename(test_image_path)}")
     
-    # Charger et redimensionner
-    img = cv2.imread(test_image_path, cv2.IMREAD_UNCHANGED)
+    # Charger et redimensionner (comme le cache des cartes d'augmentation.py)
+    img = decode_card(test_image_path, augmentation.TARGET_SIZE)
     if img is None:
         print(f"❌ Impossible de charger l'image")
         return
     
-    # Convertir RGBA en RGB si nécessaire
-    if len(img.shape) == 3 and img.shape[2] == 4:
-        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-    
-    img = cv2.resize(img, (280, 380), interpolation=cv2.INTER_AREA)
-    
     # Créer dossier de test
     test_dir = "test_augmentation_output"
     os.makedirs(test_dir, exist_ok=True)
@@ -85,17 +53,23 @@ def main():
     cv2.imwrite(os.path.join(test_dir, "00_original.png"), img)
     print(f"💾 Image originale sauvegardée")
     
-    # Générer 10 augmentations
-    print(f"\n🎨 Génération de 10 augmentations variées...")
-    for i in range(10):
-        # Seed aléatoire différent pour chaque augmentation
-        np.random.seed(int(time.time() * 1000000) % (2**31) + i)
-        random.seed(int(time.time() * 1000000) % (2**31) + i)
-        
-        aug_img = seq(image=img)
+    # Générer 10 augmentations : mêmes RNG (variation_rng) et mêmes lots que augmentation.py.
+    # Le RNG d'un lot dépend de sa première variation et de sa taille (bornée par --num_aug) :
+    # les images sont identiques à <carte>_aug_000..009 d'un run avec la même graine et
+    # les mêmes --num_aug / --batch_size
+    print(f"\n🎨 Génération de {NUM_VARIATIONS} augmentations variées (graine racine : {root_seed})...")
+    base_name = os.path.splitext(os.path.basename(test_image_path))[0]
+    batch_size = max(1, args.batch_size)
+    num_aug = max(NUM_VARIATIONS, args.num_aug)
+    starts = range(0, NUM_VARIATIONS, batch_size)
+    for i, aug_img in augmentation.generate_variations(img, base_name, num_aug, root_seed,
+                                                       batch_size, starts):
+        if i >= NUM_VARIATIONS:
+            # Reste du dernier lot : calculé pour reproduire le run, pas enregistré
+            continue
         out_path = os.path.join(test_dir, f"{i+1:02d}_augmented.png")
         cv2.imwrite(out_path, aug_img)
-        print(f"  ✅ Augmentation {i+1}/10 générée")
+        print(f"  ✅ Augmentation {i+1}/{NUM_VARIATIONS} générée")
     
     print(f"\n✅ Test terminé !")
     print(f"📂 Vérifiez les résultats dans : {test_dir}/")